@@ -1,15 +1,28 @@
+import time
+# 시작 시간 보고용 (모듈 import 시간 포함)
+START_TIME = time.perf_counter()
 import cv2
 import numpy as np
 from adb_shell.adb_device import AdbDeviceTcp
-import time
-from PIL import Image
-import io
+from adb_shell.adb_message import AdbMessage
+from adb_shell import constants as adb_constants
 import os
 import logging
 from datetime import datetime
 import atexit
 import signal
 import sys
+import struct
+import re
+import threading
+import json
+import socket
+import queue
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import OrderedDict, deque
+from scenario import (MACRO_SCENARIO, RESET_SCENARIO, RESULT_CHECK, TARGET_IMAGES,
+                      scenario_count, scenario_templates, step_name)
 
 def setup_logger():
     logger = logging.getLogger('ReseMara')
@@ -32,7 +45,84 @@ def setup_logger():
 
 logger = setup_logger()
 
+# 설정 파일이 없거나 일부 항목만 있는 경우 사용할 기본값
+DEFAULT_CONFIG = {
+    'capture_mode': 'raw',          # 'raw': 원시 프레임버퍼, 'png': screencap -p
+    'capture_backend': 'screencap', # 'screencap': 매번 캡처, 'stream': 지속 스트림
+    'stream_interval': 0.0,         # 스트림 모드에서 기기 측 캡처 간격(초)
+    'template_dir': 'Ref_Img',      # 참조 이미지 폴더
+    'template_cache_size': 0,       # 0: 시작 시 전체 로드, N: 최근 N개만 유지 (지연 로드)
+    'template_pack': 'Ref_Img.pack', # build.py 로 만든 참조 이미지 팩 (있으면 PNG 대신 메모리 매핑하여 사용)
+    'roi_mode': 'auto',             # 'off': 전체 화면, 'static': regions.json 영역만, 'auto': 발견 위치 학습
+    'roi_margin': 40,               # 탐색 영역 주변 여유 픽셀 (미발견 시 두 배씩 확장)
+    'matcher': 'full',              # 'full': 원본 해상도 단일 탐색, 'pyramid': 축소 흑백 탐색 후 후보 주변만 정밀 탐색
+    'pyramid_scale': 0.5,           # 피라미드 탐색 축소 비율
+    'pyramid_candidates': 3,        # 정밀 탐색할 후보 개수
+    'reference_size': None,         # 참조 이미지와 시나리오 좌표를 만든 화면 크기 [width, height] (지정하면 기기 해상도에 맞게 참조 이미지/좌표 변환)
+    'resume_from_screen': False,    # 저장된 진행 상태가 없을 때도 현재 화면을 인식하여 해당 단계부터 진행
+    'resume_threshold': 0.9,        # 화면으로 진행 위치를 인식할 때의 매칭 임계값 (일반 대기보다 엄격하게)
+    'resume_confirm': 3,            # 진행 위치를 인정하기 위해 같은 단계가 연속으로 인식되어야 하는 화면 수
+    'adaptive_wait': False,         # 고정 대기 대신 화면 변화가 멈추거나 다음 이미지가 나타나면 진행
+    'settle_time': 0.5,             # 화면이 이 시간(초) 동안 변하지 않으면 안정된 것으로 판단
+    'settle_poll': 0.2,             # 화면 안정 확인 간격(초)
+    'skip_unchanged': True,         # 화면이 바뀌지 않았으면 같은 참조 이미지를 다시 매칭하지 않고 이전 결과 사용
+    'change_threshold': 3,          # 축소 흑백 화면에서 한 칸이라도 이 값보다 크게 바뀌면 화면이 바뀐 것으로 판단 (적응형 대기/재매칭 생략 공통)
+    'result_watch': True,           # 뽑기 결과 화면에서 목표 캐릭터를 집계하고, 모두 얻으면 남은 뽑기를 건너뛰고 결과 확인
+    'result_threshold': 0.7,        # 뽑기 결과 화면의 목표 캐릭터 매칭 임계값
+    'checkpoint': True,             # 진행 단계와 뽑기 집계를 저장하여 오류/재시작 후 이어서 진행
+    'checkpoint_dir': 'Checkpoints', # 진행 상태 파일 폴더 (포트별 checkpoint_<포트>.json)
+    'checkpoint_max_age': 3600,     # 이 시간(초)보다 오래된 진행 상태는 버리고 새로 시작 (0: 제한 없음)
+    'adb_ports': [],                # 감독 모드에서 사용할 포트 목록 (비어 있으면 MuMu 포트 자동 검색)
+    'port_scan_count': 32,          # 자동 검색할 MuMu 인스턴스 수 (16384부터 32 간격)
+    'match_workers': 0,             # 여러 참조 이미지를 동시에 매칭할 스레드 수 (0: CPU 코어 수, 1: 병렬 매칭 안 함)
+    'max_restarts': 5,              # 감독 모드에서 작업자별 최대 재시작 횟수
+    'port_rescan_interval': 30,     # 감독 모드에서 새로 실행한 에뮬레이터를 찾는 간격(초) (0: 시작할 때만 검색)
+    'max_retries': 3,               # 오류 후 저장된 진행 상태에서 다시 시작할 최대 횟수
+    'archive_mode': 'all',          # 'off', 'all': 모든 캡처, 'sample': archive_every 장마다, 'failure': 이미지 탐색 실패 시 최근 화면만
+    'archive_every': 10,            # sample 모드 저장 간격
+    'archive_format': 'png',        # 'png' (빠른 압축), 'jpg', 'bmp' (무압축)
+    'archive_max_files': 30,        # Row_Screen 에 유지할 최대 파일 수 (failure 모드에서는 메모리 보관 수)
+    'input_method': 'input',        # 'input': input tap, 'sendevent': 터치 장치에 직접 이벤트 기록 (지연 최소화)
+    'poll_interval': 1.0,           # 이미지 대기 중 화면 캡처 간격(초) (0: 캡처가 끝나는 대로 다음 캡처)
+    'pipeline_capture': True,       # 현재 화면을 매칭하는 동안 다음 화면을 미리 캡처
+    'match_reuse_age': 1.0,         # 대기 중 찾은 위치를 다시 캡처하지 않고 바로 클릭에 사용할 수 있는 최대 경과 시간(초)
+    'shell_sessions': 1,            # 유지할 대화형 shell 세션 수 (0: 명령마다 새 스트림)
+    'app_package': None,            # 게임 패키지 이름 (비어 있으면 처음 앱 종료 시 화면에서 확인)
+    'app_activity': None,           # 게임 시작 액티비티 (비어 있으면 monkey 로 런처 인텐트 실행)
+    'launch_method': 'auto',        # 'auto': 패키지를 알면 직접 실행, 모르면 아이콘 클릭, 'icon': 항상 아이콘 클릭
+    'metrics': False,               # 캡처/매칭/shell/단계 소요 시간을 JSON-lines 로 기록하고 종료 시 요약 저장
+    'metrics_dir': 'Metrics',       # 추적 파일 폴더 (실행마다 trace_<시각>.jsonl 생성)
+}
+
+def load_config(path='ReseMara.json'):
+    """
+    설정 파일을 읽어 기본값과 병합하는 함수
+    
+    Args:
+        path (str): 설정 파일 경로 (JSON)
+        
+    Returns:
+        dict: 설정값
+    """
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+            logger.debug(f"설정 파일 로드 완료: {path}")
+        except Exception as e:
+            logger.error(f"설정 파일 읽기 실패: {str(e)}")
+    return config
+
+# 감독 모드에서는 여러 작업자가 동시에 실행되므로 입력 대기 대신 예외로 작업자를 재시작
+interactive = True
+
+# 다시 시도해도 같은 결과가 나오는 오류 (참조 이미지 누락, 설정/코드 오류 등) - 재시도/재시작하지 않음
+FATAL_ERRORS = (FileNotFoundError, KeyError, TypeError, AttributeError, ImportError)
+
 def wait_for_user_input():
+    if not interactive:
+        raise RuntimeError("감독 모드에서는 사용자 입력을 기다릴 수 없어 작업자를 재시작합니다")
     input("계속하려면 아무 키나 누르세요...")
 
 def cleanup():
@@ -44,6 +134,11 @@ def cleanup():
     
     logger.debug("정리 작업 시작")
     try:
+        if 'supervisor' in globals() and supervisor is not None:
+            supervisor.stop()
+        
+        metrics.close()
+        
         if 'macro' in globals() and macro is not None:
             macro.close()
             
@@ -72,9 +167,1952 @@ def cleanup():
     
     logger.debug("프로그램 종료")
 
+class Metrics:
+    """
+    캡처 / 매칭 / shell / 시나리오 단계의 소요 시간을 기록하는 클래스
+    이벤트마다 JSON 한 줄을 추적 파일에 쓰고, 종료 시 종류/이름별 요약 히스토그램을 저장
+    (open 하기 전에는 아무것도 기록하지 않음)
+    """
+    # 히스토그램 구간 상한 (밀리초), 마지막 구간은 그 이상
+    BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.file = None
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def open(self, folder='Metrics'):
+        """실행마다 새 추적 파일을 생성하는 함수 (이전 실행 기록은 유지)"""
+        os.makedirs(folder, exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = os.path.join(folder, f"trace_{name}.jsonl")
+        # 비정상 종료 시에도 기록이 남도록 줄 단위로 기록
+        self.file = open(self.path, 'a', encoding='utf-8', buffering=1)
+        self.enabled = True
+        logger.info(f"성능 추적 기록: {self.path}")
+
+    def record(self, kind, name, duration, **fields):
+        """
+        이벤트 하나를 기록하는 함수
+        
+        Args:
+            kind (str): 종류 (capture, match, shell, step, wait 등)
+            name (str): 이름 (참조 이미지 이름, 명령 이름 등)
+            duration (float): 소요 시간(초)
+            fields: 추가 정보 (port, score, threshold, found, polls, timed_out 등)
+        """
+        if not self.enabled:
+            return
+        millis = duration * 1000
+        line = json.dumps({'time': round(time.time(), 3), 'kind': kind, 'name': name,
+                           'ms': round(millis, 3), **fields}, ensure_ascii=False)
+        
+        bucket = len(self.BUCKETS)
+        for index, limit in enumerate(self.BUCKETS):
+            if millis < limit:
+                bucket = index
+                break
+        
+        with self.lock:
+            self.file.write(line + '\n')
+            stat = self.stats.get((kind, name))
+            if stat is None:
+                stat = self.stats[(kind, name)] = {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0,
+                                                   'found_min': None, 'miss_max': None,
+                                                   'buckets': [0] * (len(self.BUCKETS) + 1)}
+            stat['count'] += 1
+            stat['total'] += millis
+            stat['max'] = max(stat['max'], millis)
+            stat['buckets'][bucket] += 1
+            if fields.get('timed_out'):
+                stat['timeouts'] += 1
+            score = fields.get('score')
+            if score is not None:
+                # 임계값 조정용: 발견했을 때의 최저 점수 / 발견하지 못했을 때의 최고 점수
+                if fields.get('found'):
+                    stat['found_min'] = score if stat['found_min'] is None else min(stat['found_min'], score)
+                else:
+                    stat['miss_max'] = score if stat['miss_max'] is None else max(stat['miss_max'], score)
+
+    def _percentile(self, buckets, ratio):
+        """구간별 횟수에서 백분위가 속한 구간의 상한(밀리초)을 구하는 함수"""
+        target = sum(buckets) * ratio
+        seen = 0
+        for index, count in enumerate(buckets):
+            seen += count
+            if seen >= target:
+                return f"<{self.BUCKETS[index]}ms" if index < len(self.BUCKETS) else f">={self.BUCKETS[-1]}ms"
+        return '-'
+
+    def summary(self):
+        """
+        종류별 히스토그램과 이름별 통계를 문자열로 만드는 함수
+        
+        Returns:
+            str: 요약 내용
+        """
+        lines = []
+        with self.lock:
+            stats = {key: dict(value, buckets=list(value['buckets'])) for key, value in self.stats.items()}
+        
+        for kind in sorted({kind for kind, _ in stats}):
+            entries = {name: stat for (k, name), stat in stats.items() if k == kind}
+            buckets = [sum(column) for column in zip(*(stat['buckets'] for stat in entries.values()))]
+            total = sum(buckets)
+            lines.append(f"[{kind}] {total}회")
+            
+            # 종류 전체 히스토그램
+            peak = max(buckets)
+            for index, count in enumerate(buckets):
+                if not count:
+                    continue
+                label = f"<{self.BUCKETS[index]}ms" if index < len(self.BUCKETS) else f">={self.BUCKETS[-1]}ms"
+                lines.append(f"  {label:>9} {count:>7} {'#' * max(1, count * 40 // peak)}")
+            
+            # 이름별 통계 (총 소요 시간이 큰 순)
+            for name, stat in sorted(entries.items(), key=lambda item: -item[1]['total']):
+                line = (f"  {name:<32} {stat['count']:>6}회 평균 {stat['total'] / stat['count']:8.2f}ms "
+                        f"p50 {self._percentile(stat['buckets'], 0.5):>8} p90 {self._percentile(stat['buckets'], 0.9):>8} "
+                        f"최대 {stat['max']:8.2f}ms")
+                if stat['timeouts']:
+                    line += f" 시간초과 {stat['timeouts']}회"
+                if stat['found_min'] is not None or stat['miss_max'] is not None:
+                    found_min = '-' if stat['found_min'] is None else f"{stat['found_min']:.4f}"
+                    miss_max = '-' if stat['miss_max'] is None else f"{stat['miss_max']:.4f}"
+                    line += f" 발견 최저 {found_min} / 미발견 최고 {miss_max}"
+                lines.append(line)
+            lines.append('')
+        return '\n'.join(lines)
+
+    def close(self):
+        """추적 파일을 닫고 요약을 같은 이름의 _summary.txt 로 저장하는 함수"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        with self.lock:
+            self.file.close()
+        summary_path = self.path[:-len('.jsonl')] + '_summary.txt'
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(self.summary())
+        logger.info(f"성능 요약 저장: {summary_path}")
+
+metrics = Metrics()
+
+class StartupTimer:
+    """
+    프로그램 시작부터 첫 화면 캡처까지의 구간별 소요 시간을 기록하는 클래스
+    (포트 입력처럼 사용자를 기다린 구간은 따로 표시하고 합계에서 제외)
+    매크로를 직접 실행한 경우에만 enabled 로 켜고, 벤치마크 등에서 import 한 경우에는 기록하지 않음
+    """
+    def __init__(self, start):
+        self.enabled = False
+        self.start = start
+        self.last = start
+        self.marks = []
+        self.waited = 0.0
+        self.reported = False
+
+    def mark(self, name, waiting=False):
+        """
+        직전 기록부터 지금까지를 한 구간으로 기록하는 함수
+        
+        Args:
+            name (str): 구간 이름
+            waiting (bool): 사용자 입력 대기 구간 여부
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.marks.append((name, now - self.last, waiting))
+        if waiting:
+            self.waited += now - self.last
+        self.last = now
+
+    def report(self):
+        """첫 캡처 시 한 번만 구간별 시간을 로그와 성능 추적에 기록하는 함수"""
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        total = self.last - self.start - self.waited
+        lines = [f"  {name:<14} {elapsed * 1000:8.1f}ms" + (" (입력 대기, 합계 제외)" if waiting else "")
+                 for name, elapsed, waiting in self.marks]
+        logger.info(f"시작 후 첫 캡처까지 {total * 1000:.0f}ms\n" + "\n".join(lines))
+        for name, elapsed, waiting in self.marks:
+            metrics.record('startup', name, elapsed, waiting=waiting)
+        metrics.record('startup', 'total', total)
+
+startup = StartupTimer(START_TIME)
+
+# screencap 원시 프레임버퍼의 픽셀 포맷 (android PixelFormat 값)
+RAW_PIXEL_FORMATS = {
+    1: 'RGBA_8888',
+    2: 'RGBX_8888',
+    5: 'BGRA_8888',
+}
+
+def parse_raw_pixels(data):
+    """
+    `screencap` (-p 없이) 출력을 복사 없이 픽셀 배열로 해석하는 함수
+    헤더는 width, height, format (각 uint32, little-endian) 12바이트이며
+    Android 9 이상에서는 colorspace 필드가 추가되어 16바이트가 된다
+    
+    Args:
+        data (bytes): screencap 원시 출력
+        
+    Returns:
+        tuple: ((height, width, 4) 배열, 채널 순서 'RGBA' 또는 'BGRA') (해석할 수 없는 경우 None)
+    """
+    if len(data) < 12:
+        return None
+    
+    width, height, pixel_format = struct.unpack_from('<III', data, 0)
+    if pixel_format not in RAW_PIXEL_FORMATS:
+        return None
+    
+    # 헤더 크기는 전체 길이에서 픽셀 데이터 길이를 빼서 판별
+    pixel_bytes = width * height * 4
+    header_size = len(data) - pixel_bytes
+    if header_size not in (12, 16):
+        return None
+    
+    pixels = np.frombuffer(data, dtype=np.uint8, count=pixel_bytes, offset=header_size)
+    # RGBX 의 X 채널은 BGR 변환 시 버려지므로 RGBA 와 같이 취급
+    return pixels.reshape(height, width, 4), 'BGRA' if pixel_format == 5 else 'RGBA'
+
+class Frame:
+    """
+    캡처한 화면 한 장
+    원본 픽셀은 그대로 두고 매칭용 BGR 은 처음 필요할 때 한 번만 변환하며,
+    흑백/축소/변화 비교용 이미지도 처음 필요할 때 만들어 같은 프레임 안에서 재사용
+    """
+    # 원본 채널 순서 -> BGR 변환 코드 (None: 변환 불필요)
+    BGR_CODES = {
+        'RGBA': cv2.COLOR_RGBA2BGR,
+        'BGRA': cv2.COLOR_BGRA2BGR,
+        'RGB': cv2.COLOR_RGB2BGR,
+        'BGR': None,
+    }
+
+    def __init__(self, pixels, order='RGBA', frame_id=0):
+        """
+        Args:
+            pixels (np.ndarray): 원본 픽셀 (호출 후 내용이 바뀌지 않아야 함)
+            order (str): 채널 순서 ('RGBA', 'BGRA', 'RGB', 'BGR')
+            frame_id (int): 프레임 번호
+        """
+        self.pixels = pixels
+        self.order = order
+        self.id = frame_id
+        self.time = time.time()
+        self.height, self.width = pixels.shape[:2]
+        # BGR 변환 결과를 담을 재사용 버퍼 (FrameBuffers 가 지정)
+        self.buffer = None
+        self._bgr = None
+        self._gray = None
+        self._scaled = {}
+        self._signature = None
+
+    @property
+    def shape(self):
+        return (self.height, self.width, 3)
+
+    @property
+    def bgr(self):
+        """매칭용 BGR 이미지 (처음 접근할 때 한 번만 변환)"""
+        if self._bgr is None:
+            code = self.BGR_CODES[self.order]
+            if code is None:
+                self._bgr = self.pixels
+            else:
+                self._bgr = cv2.cvtColor(self.pixels, code, dst=self.buffer)
+        return self._bgr
+
+    @property
+    def gray(self):
+        """흑백 이미지"""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def scaled_gray(self, scale):
+        """축소된 흑백 이미지 (비율별로 한 번만 계산)"""
+        gray = self._scaled.get(scale)
+        if gray is None:
+            gray = cv2.resize(self.gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            self._scaled[scale] = gray
+        return gray
+
+    @property
+    def signature(self):
+        """화면 변화 비교용 64x36 흑백 이미지 (int16)"""
+        if self._signature is None:
+            self._signature = cv2.resize(self.gray, (64, 36), interpolation=cv2.INTER_AREA).astype(np.int16)
+        return self._signature
+
+    def release_buffer(self):
+        """재사용 버퍼를 다른 프레임에 넘겨주기 전에 호출 (이후 bgr 은 새 메모리에 다시 변환)"""
+        if self.buffer is not None and self._bgr is self.buffer:
+            self._bgr = None
+        self.buffer = None
+
+class MatchResult:
+    """
+    참조 이미지를 찾은 결과 (위치, 점수, 찾은 프레임)
+    대기 함수가 찾은 위치를 클릭 함수가 다시 캡처/매칭하지 않고 사용할 수 있도록 반환
+    """
+    def __init__(self, template, score, loc, frame, input_count):
+        """
+        Args:
+            template (Template): 참조 이미지
+            score (float): 매칭 점수
+            loc (tuple): 화면 기준 좌상단 좌표
+            frame (Frame): 찾은 화면
+            input_count (int): 찾은 시점까지 보낸 입력 횟수 (이후 입력이 있었는지 확인용)
+        """
+        self.name = template.name
+        self.score = score
+        self.loc = loc
+        self.width = template.width
+        self.height = template.height
+        self.frame_id = frame.id
+        self.time = frame.time
+        self.input_count = input_count
+
+    @property
+    def center(self):
+        return self.loc[0] + self.width // 2, self.loc[1] + self.height // 2
+
+class FramePoller:
+    """
+    이미지 대기 루프에서 poll_interval 간격으로 화면을 가져오는 클래스
+    pipeline 사용 시 현재 프레임을 매칭하는 동안 캡처 스레드에서 다음 프레임을 미리 캡처
+    (BGR 버퍼 두 개를 번갈아 사용하므로 매칭 중인 프레임과 다음 프레임이 겹치지 않음)
+    루프가 끝나면 close 로 미리 요청한 캡처를 버려 이후 입력 전 화면이 사용되지 않도록 함
+    """
+    def __init__(self, macro, interval, executor=None):
+        """
+        Args:
+            macro (ReseMara): 캡처할 ReseMara
+            interval (float): 캡처 시작 간격(초)
+            executor (ThreadPoolExecutor): 미리 캡처할 스레드 (None이면 매번 현재 스레드에서 캡처)
+        """
+        self.macro = macro
+        self.interval = max(0.0, interval)
+        self.executor = executor
+        self.pending = None
+        self.next_start = None
+        self.cancelled = threading.Event()
+
+    def _grab(self, not_before):
+        """not_before 시각까지 기다린 뒤 캡처 (취소되면 None)"""
+        while not self.cancelled.is_set():
+            delay = not_before - time.time()
+            if delay <= 0:
+                return time.time(), self.macro._grab_frame()
+            time.sleep(min(delay, 0.05))
+        return None
+
+    def next(self):
+        """
+        다음 화면을 반환하는 함수
+        
+        Returns:
+            Frame: 캡처한 화면
+        """
+        if self.pending is not None:
+            future, self.pending = self.pending, None
+            start, frame = future.result()
+        else:
+            start, frame = self._grab(self.next_start or 0)
+        
+        self.next_start = start + self.interval
+        if self.executor is not None:
+            self.pending = self.executor.submit(self._grab, self.next_start)
+        return self.macro._accept_frame(frame)
+
+    def close(self):
+        """
+        미리 요청한 캡처를 버리는 함수 (이미 캡처 중이면 다음 입력과 겹치지 않도록 끝날 때까지 대기)
+        입력을 보내기 전에 호출해야 하며, 여러 번 호출해도 됨
+        """
+        self.cancelled.set()
+        if self.pending is not None:
+            future, self.pending = self.pending, None
+            if not future.cancel():
+                wait([future])
+
+class FrameBuffers:
+    """
+    프레임의 BGR 변환 결과를 담을 버퍼를 돌려 쓰는 클래스
+    매 캡처마다 화면 크기의 배열을 새로 할당하지 않도록 count 개의 버퍼를 순서대로 재사용
+    (버퍼를 넘겨받은 프레임보다 count 장 이전 프레임은 bgr 을 다시 변환해야 함)
+    """
+    def __init__(self, count=2):
+        self.slots = [[None, None] for _ in range(count)]  # [버퍼, 사용 중인 프레임]
+        self.index = 0
+
+    def assign(self, frame):
+        """프레임에 다음 버퍼를 지정하는 함수"""
+        if frame.buffer is not None or frame._bgr is not None or frame.BGR_CODES[frame.order] is None:
+            return
+        slot = self.slots[self.index]
+        self.index = (self.index + 1) % len(self.slots)
+        
+        buffer, owner = slot
+        if owner is not None:
+            owner.release_buffer()
+        if buffer is None or buffer.shape != frame.shape:
+            buffer = np.empty(frame.shape, dtype=np.uint8)
+        frame.buffer = buffer
+        slot[0], slot[1] = buffer, frame
+
+class RawFrameStreamParser:
+    """
+    연속된 screencap 원시 출력 바이트 스트림을 프레임 단위로 잘라내는 클래스
+    (기기 측 `while true; do screencap; done` 출력 또는 녹화된 스트림 파일)
+    """
+    def __init__(self, header_size):
+        self.header_size = header_size
+        self.buffer = bytearray()
+        self.frame_size = None
+
+    def feed(self, chunk):
+        """
+        수신한 바이트를 누적하고 완성된 프레임들을 반환하는 함수
+        
+        Args:
+            chunk (bytes): 스트림에서 읽은 데이터
+            
+        Returns:
+            list: 완성된 Frame 목록
+        """
+        self.buffer += chunk
+        frames = []
+        while True:
+            if self.frame_size is None:
+                if len(self.buffer) < self.header_size:
+                    break
+                width, height, _ = struct.unpack_from('<III', self.buffer, 0)
+                self.frame_size = self.header_size + width * height * 4
+            
+            if len(self.buffer) < self.frame_size:
+                break
+            
+            parsed = parse_raw_pixels(bytes(self.buffer[:self.frame_size]))
+            del self.buffer[:self.frame_size]
+            self.frame_size = None
+            if parsed is None:
+                raise ValueError("스트림에서 해석할 수 없는 프레임을 받았습니다")
+            frames.append(Frame(*parsed))
+        return frames
+
+def iter_recorded_stream(path, chunk_size=65536):
+    """
+    녹화된 원시 스트림 파일을 청크 단위로 읽는 함수
+    (`adb exec-out "while true; do screencap; done" > record.raw` 로 녹화)
+    """
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+class ScreencapCapture:
+    """매 호출마다 screencap 명령을 실행하는 캡처 백엔드"""
+    def __init__(self, device, capture_mode='raw'):
+        self.device = device
+        self.capture_mode = capture_mode
+
+    def grab(self):
+        """
+        화면을 한 번 캡처하는 함수
+        
+        Returns:
+            Frame: 캡처한 화면
+        """
+        if self.capture_mode == 'raw':
+            parsed = parse_raw_pixels(self.device.shell('screencap', decode=False))
+            if parsed is not None:
+                return Frame(*parsed)
+            # 원시 포맷을 해석할 수 없는 기기는 이후 PNG 캡처만 사용
+            logger.warning("원시 프레임버퍼를 해석할 수 없어 PNG 캡처로 전환합니다")
+            self.capture_mode = 'png'
+        
+        # PNG 는 매칭에 사용하는 BGR 로 바로 디코딩
+        result = self.device.shell('screencap -p', decode=False)
+        screen = cv2.imdecode(np.frombuffer(result, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if screen is None:
+            raise ValueError("PNG 화면을 디코딩할 수 없습니다")
+        return Frame(screen, 'BGR')
+
+    def close(self):
+        pass
+
+class StreamCapture:
+    """
+    기기와 하나의 스트림을 유지하며 백그라운드 스레드에서
+    최신 프레임을 갱신하는 캡처 백엔드
+    """
+    def __init__(self, source_factory, header_size, frame_timeout=10):
+        """
+        Args:
+            source_factory (callable): 바이트 청크를 내보내는 이터러블을 생성하는 함수
+                                       (끊어지면 다시 호출하여 재연결)
+            header_size (int): 원시 프레임 헤더 크기 (12 또는 16)
+            frame_timeout (float): 첫 프레임을 기다릴 최대 시간(초)
+        """
+        self.source_factory = source_factory
+        self.header_size = header_size
+        self.frame_timeout = frame_timeout
+        self.frame = None
+        self.frame_id = 0
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='ScreenStream', daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_device(cls, device, interval=0.0):
+        """
+        ADB 기기에 screencap 반복 스트림을 여는 백엔드를 생성하는 함수
+        
+        Returns:
+            StreamCapture: 생성된 백엔드 (원시 포맷을 지원하지 않으면 None)
+        """
+        # 헤더 크기(12/16)는 기기마다 다르므로 한 번 캡처하여 확인
+        data = device.shell('screencap', decode=False)
+        if parse_raw_pixels(data) is None:
+            return None
+        width, height, _ = struct.unpack_from('<III', data, 0)
+        header_size = len(data) - width * height * 4
+        
+        command = 'while true; do screencap; done'
+        if interval > 0:
+            command = f'while true; do screencap; sleep {interval}; done'
+        return cls(lambda: device.streaming_shell(command, decode=False), header_size)
+
+    def _run(self):
+        while self.running:
+            try:
+                parser = RawFrameStreamParser(self.header_size)
+                for chunk in self.source_factory():
+                    if not self.running:
+                        break
+                    for frame in parser.feed(chunk):
+                        with self.condition:
+                            self.frame = frame
+                            self.frame_id += 1
+                            self.condition.notify_all()
+            except Exception as e:
+                logger.error(f"화면 스트림 오류, 재연결합니다: {str(e)}")
+                time.sleep(1)
+
+    def grab(self):
+        """
+        가장 최근 프레임을 반환하는 함수 (첫 프레임 수신 전에만 대기)
+        새 프레임이 없으면 같은 Frame 을 반환하므로 변환 결과도 그대로 재사용
+        
+        Returns:
+            Frame: 캡처한 화면
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.frame is not None, self.frame_timeout):
+                raise TimeoutError("화면 스트림에서 프레임을 받지 못했습니다")
+            return self.frame
+
+    def close(self):
+        self.running = False
+
+def create_capture_backend(device, config, shell=None):
+    """
+    설정에 맞는 화면 캡처 백엔드를 생성하는 함수
+    
+    Args:
+        device: shell / streaming_shell 을 제공하는 ADB 기기
+        config (dict): 설정값
+        shell: 단발 캡처에 사용할 shell 제공 객체 (None이면 device, 예: ShellSessionPool)
+    """
+    if shell is None:
+        shell = device
+    if config['capture_backend'] == 'stream':
+        backend = StreamCapture.from_device(device, config['stream_interval'])
+        if backend is not None:
+            logger.debug("화면 스트림 캡처를 사용합니다")
+            return backend
+        logger.warning("원시 프레임버퍼를 지원하지 않아 screencap 캡처를 사용합니다")
+        return ScreencapCapture(shell, 'png')
+    return ScreencapCapture(shell, config['capture_mode'])
+
+class Template:
+    """참조 이미지 한 장과 매칭에 필요한 사전 계산 데이터"""
+    def __init__(self, name, image):
+        """
+        Args:
+            name (str): 참조 이미지 이름 (확장자 제외)
+            image (np.ndarray): IMREAD_UNCHANGED 로 읽은 이미지
+        """
+        self.name = name
+        self.mask = None
+        if image.ndim == 2:
+            self.bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:
+            self.bgr = np.ascontiguousarray(image[:, :, :3])
+            # 투명 영역이 있는 경우에만 마스크 매칭 사용
+            alpha = image[:, :, 3]
+            if alpha.min() < 255:
+                self.mask = cv2.merge([alpha, alpha, alpha])
+        else:
+            self.bgr = image
+        self._assign(cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    @classmethod
+    def from_arrays(cls, name, bgr, gray, mask=None):
+        """미리 변환해 둔 배열로 Template 을 만드는 함수 (템플릿 팩의 메모리 매핑 배열을 복사 없이 사용)"""
+        template = cls.__new__(cls)
+        template.name = name
+        template.bgr = bgr
+        template.mask = mask
+        template._assign(gray)
+        return template
+
+    def _assign(self, gray):
+        self.gray = gray
+        self.height, self.width = self.bgr.shape[:2]
+        # 고정 탐색 영역 (x, y, width, height), 없으면 None
+        self.region = None
+        self.scaled = {}
+        # 화면 배율 -> 크기를 바꾼 Template (해상도가 다른 기기용)
+        self.variants = {}
+
+    def scaled_gray(self, scale):
+        """축소된 흑백 참조 이미지를 반환하는 함수 (비율별로 한 번만 계산)"""
+        gray = self.scaled.get(scale)
+        if gray is None:
+            gray = cv2.resize(self.gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            self.scaled[scale] = gray
+        return gray
+
+    def at_scale(self, scale, region_scale=None):
+        """
+        화면 배율에 맞게 크기를 바꾼 참조 이미지를 반환하는 함수 (배율별로 한 번만 계산)
+        
+        Args:
+            scale (float): 참조 이미지 픽셀 배율 (종횡비 유지)
+            region_scale (tuple): 고정 탐색 영역의 (가로, 세로) 배율 (None이면 scale)
+            
+        Returns:
+            Template: 배율이 모두 1이면 자기 자신
+        """
+        if region_scale is None:
+            region_scale = (scale, scale)
+        if scale == 1.0 and (self.region is None or region_scale == (1.0, 1.0)):
+            return self
+        key = (scale, region_scale if self.region is not None else None)
+        template = self.variants.get(key)
+        if template is None:
+            if scale == 1.0:
+                # 탐색 영역만 다르면 픽셀 배열은 그대로 공유
+                template = Template.from_arrays(self.name, self.bgr, self.gray, self.mask)
+            else:
+                # 투명 영역이 있으면 알파 채널도 함께 변환하여 마스크 유지
+                image = self.bgr if self.mask is None else np.dstack([self.bgr, self.mask[:, :, 0]])
+                size = (max(1, round(self.width * scale)), max(1, round(self.height * scale)))
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+                template = Template(self.name, image)
+            if self.region is not None:
+                # 화면 종횡비가 다르면 영역 위치/크기는 가로/세로를 각각 변환
+                x, y, width, height = self.region
+                scale_x, scale_y = region_scale
+                template.region = (int(round(x * scale_x)), int(round(y * scale_y)),
+                                   int(round(width * scale_x)), int(round(height * scale_y)))
+            self.variants[key] = template
+        return template
+
+class TemplatePack:
+    """
+    Ref_Img 참조 이미지를 디코딩/변환한 배열(bgr, gray, mask)을 한 파일에 모아 둔 템플릿 팩
+    파일 구조: MAGIC(8) + 색인 길이(uint32) + 색인(JSON) + 64바이트 단위로 정렬한 배열 데이터
+    실행 시 데이터를 메모리 매핑하므로 PNG 디코딩이 없고, 여러 프로세스가 같은 페이지를 공유
+    """
+    MAGIC = b'RMPACK01'
+    ALIGN = 64
+
+    def __init__(self, path, version, entries, data):
+        self.path = path
+        self.version = version
+        self.entries = entries
+        self.data = data
+
+    @staticmethod
+    def source_version(folder):
+        """
+        참조 이미지 폴더 내용(PNG 와 regions.json)의 해시를 계산하는 함수
+        
+        Returns:
+            str: 내용 해시 (폴더가 없거나 PNG 가 없으면 None)
+        """
+        if not os.path.isdir(folder):
+            return None
+        filenames = sorted(f for f in os.listdir(folder) if f.endswith('.png'))
+        if not filenames:
+            return None
+        digest = hashlib.sha256()
+        for filename in filenames + ['regions.json']:
+            path = os.path.join(folder, filename)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest.update(f'{filename}:{len(data)}\0'.encode('utf-8'))
+            digest.update(data)
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def build(cls, folder, path):
+        """
+        참조 이미지 폴더를 템플릿 팩 파일로 만드는 함수
+        
+        Args:
+            folder (str): 참조 이미지 폴더
+            path (str): 저장할 팩 파일 경로
+            
+        Returns:
+            str: 팩 버전 (폴더 내용 해시)
+        """
+        registry = TemplateRegistry(folder)
+        registry.preload()
+        
+        entries = {}
+        arrays = []
+        offset = 0
+        for name, template in registry.templates.items():
+            entry = {'region': template.region}
+            for key in ('bgr', 'gray', 'mask'):
+                array = getattr(template, key)
+                if array is None:
+                    entry[key] = None
+                    continue
+                offset += -offset % cls.ALIGN
+                entry[key] = [offset, list(array.shape)]
+                arrays.append((offset, np.ascontiguousarray(array)))
+                offset += array.nbytes
+            entries[name] = entry
+        
+        version = cls.source_version(folder)
+        index = json.dumps({'version': version, 'templates': entries}, ensure_ascii=False).encode('utf-8')
+        header = cls.MAGIC + struct.pack('<I', len(index)) + index
+        header += b'\0' * (-len(header) % cls.ALIGN)
+        
+        # 빌드가 중간에 실패해도 쓰다 만 팩이 남지 않도록 임시 파일에 쓴 뒤 교체
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            position = 0
+            for start, array in arrays:
+                f.write(b'\0' * (start - position))
+                f.write(array.tobytes())
+                position = start + array.nbytes
+        try:
+            os.replace(temp_path, path)
+        except PermissionError:
+            # Windows 에서는 실행 중인 매크로가 메모리 매핑한 파일을 교체할 수 없음
+            os.remove(temp_path)
+            raise PermissionError(f"템플릿 팩을 교체할 수 없습니다: {path} "
+                                  f"(팩을 사용 중인 매크로를 모두 종료한 뒤 다시 빌드하세요)")
+        logger.info(f"템플릿 팩 생성 완료: {path} ({len(entries)}개, 버전 {version})")
+        return version
+
+    @classmethod
+    def load(cls, path):
+        """
+        템플릿 팩을 메모리 매핑으로 여는 함수
+        
+        Raises:
+            ValueError: 템플릿 팩 형식이 아닌 경우
+        """
+        with open(path, 'rb') as f:
+            head = f.read(len(cls.MAGIC) + 4)
+            if head[:len(cls.MAGIC)] != cls.MAGIC:
+                raise ValueError(f"템플릿 팩 형식이 아닙니다: {path}")
+            length = struct.unpack_from('<I', head, len(cls.MAGIC))[0]
+            index = json.loads(f.read(length).decode('utf-8'))
+        
+        start = len(head) + length
+        start += -start % cls.ALIGN
+        data = None
+        if os.path.getsize(path) > start:
+            data = np.memmap(path, dtype=np.uint8, mode='r', offset=start)
+        return cls(path, index['version'], index['templates'], data)
+
+    def names(self):
+        return list(self.entries)
+
+    def template(self, name):
+        """
+        팩에서 참조 이미지를 꺼내는 함수 (배열은 복사하지 않고 메모리 매핑 영역을 그대로 사용)
+        
+        Returns:
+            Template: 참조 이미지 (팩에 없으면 None)
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        arrays = []
+        for key in ('bgr', 'gray', 'mask'):
+            if entry[key] is None:
+                arrays.append(None)
+                continue
+            offset, shape = entry[key]
+            size = int(np.prod(shape))
+            arrays.append(self.data[offset:offset + size].reshape(shape))
+        template = Template.from_arrays(name, *arrays)
+        if entry['region'] is not None:
+            template.region = tuple(entry['region'])
+        return template
+
+class TemplateRegistry:
+    """
+    Ref_Img 참조 이미지를 한 번만 디코딩하여 보관하는 클래스
+    max_cached 가 0 이면 전체를 메모리에 유지하고, 그 외에는 LRU 로 개수를 제한
+    템플릿 팩이 있으면 팩에 있는 이미지는 PNG 대신 팩에서 꺼냄
+    """
+    def __init__(self, folder='Ref_Img', max_cached=0, pack=None):
+        self.folder = folder
+        self.max_cached = max_cached
+        self.pack = pack
+        self.templates = OrderedDict()
+        self.lock = threading.Lock()
+        self.regions = self._load_regions()
+
+    def _load_regions(self):
+        # regions.json: {"이미지 이름": [x, y, width, height], ...}
+        path = os.path.join(self.folder, 'regions.json')
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return {name: tuple(region) for name, region in json.load(f).items()}
+        except Exception as e:
+            logger.error(f"탐색 영역 파일 읽기 실패: {str(e)}")
+            return {}
+
+    def path(self, name):
+        return os.path.join(self.folder, f'{name}.png')
+
+    def _load(self, name):
+        if self.pack is not None:
+            template = self.pack.template(name)
+            if template is not None:
+                return template
+        
+        # cv2.imread 는 한글 경로를 읽지 못하므로 바이트로 읽은 뒤 디코딩
+        path = self.path(name)
+        if not os.path.exists(path):
+            return None
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if image is None:
+            return None
+        template = Template(name, image)
+        template.region = self.regions.get(name)
+        return template
+
+    def preload(self):
+        """
+        폴더의 모든 참조 이미지를 미리 로드하는 함수
+        
+        Returns:
+            int: 로드한 이미지 개수
+        """
+        names = set(self.pack.names()) if self.pack is not None else set()
+        if os.path.isdir(self.folder):
+            names.update(f[:-4] for f in os.listdir(self.folder) if f.endswith('.png'))
+        names = sorted(names)
+        if self.max_cached:
+            names = names[:self.max_cached]
+        for name in names:
+            self.get(name)
+        logger.debug(f"참조 이미지 {len(self.templates)}개 로드 완료")
+        return len(self.templates)
+
+    def get(self, name):
+        """
+        참조 이미지를 반환하는 함수 (캐시에 없으면 로드)
+        
+        Returns:
+            Template: 참조 이미지 (파일이 없거나 읽을 수 없으면 None)
+        """
+        with self.lock:
+            template = self.templates.get(name)
+            if template is not None:
+                self.templates.move_to_end(name)
+                return template
+        
+        template = self._load(name)
+        if template is None:
+            return None
+        
+        with self.lock:
+            self.templates[name] = template
+            if self.max_cached and len(self.templates) > self.max_cached:
+                self.templates.popitem(last=False)
+        return template
+
+    def require(self, names):
+        """
+        참조 이미지들이 모두 존재하는지 확인하는 함수
+        
+        Raises:
+            FileNotFoundError: 누락되었거나 읽을 수 없는 이미지가 있는 경우
+        """
+        missing = [name for name in dict.fromkeys(names) if self.get(name) is None]
+        if missing:
+            raise FileNotFoundError(f"참조 이미지를 찾을 수 없음: {', '.join(missing)}")
+
+    def prepare_scale(self, scale, region_scale=None):
+        """
+        메모리에 있는 참조 이미지의 배율별 변환을 미리 계산하는 함수
+        (첫 이미지 대기에서 변환 시간이 들지 않도록 하며, 같은 해상도의 기기끼리 공유)
+        """
+        with self.lock:
+            templates = list(self.templates.values())
+        for template in templates:
+            template.at_scale(scale, region_scale)
+        return len(templates)
+
+def create_template_registry(config):
+    """
+    설정에 맞는 TemplateRegistry 를 생성하는 함수
+    템플릿 팩이 있으면 사용하되, template_dir 폴더에 PNG 가 있고 내용 해시가 팩 버전과 다르면
+    오래된 팩으로 보고 PNG 를 직접 읽음 (폴더 없이 팩만 배포한 경우에는 팩을 그대로 사용)
+    """
+    pack = None
+    path = config['template_pack']
+    if path and os.path.exists(path):
+        try:
+            pack = TemplatePack.load(path)
+            version = TemplatePack.source_version(config['template_dir'])
+            if version is not None and version != pack.version:
+                logger.warning(f"템플릿 팩이 {config['template_dir']} 폴더 내용과 다릅니다 "
+                               f"(팩 {pack.version}, 폴더 {version}). 참조 이미지를 PNG 에서 읽습니다")
+                pack = None
+            else:
+                logger.debug(f"템플릿 팩 사용: {path} (버전 {pack.version}, {len(pack.entries)}개)")
+        except Exception as e:
+            logger.error(f"템플릿 팩 읽기 실패: {str(e)}")
+            pack = None
+    return TemplateRegistry(config['template_dir'], config['template_cache_size'], pack)
+
+class ScreenScaler:
+    """
+    참조 이미지/시나리오 좌표를 만든 화면 크기(reference_size)와 기기 화면 크기의 비율을 관리하는 클래스
+    참조 이미지 픽셀은 종횡비를 유지해야 하므로 가로/세로 비율 중 작은 값을 사용하고,
+    좌표와 고정 탐색 영역은 가로/세로를 각각 변환
+    화면 크기(와 방향)는 실제로 캡처한 화면에서 읽음 (wm size 는 회전 전 크기라 방향을 알 수 없음)
+    """
+    def __init__(self, reference_size=None):
+        self.reference = tuple(reference_size) if reference_size else None
+        self.size = None
+        self.scale = 1.0
+        self.scale_x = 1.0
+        self.scale_y = 1.0
+
+    def update(self, width, height):
+        """
+        캡처한 화면 크기로 비율을 다시 계산하는 함수
+        
+        Returns:
+            bool: 화면 크기가 바뀌었는지 여부
+        """
+        if (width, height) == self.size:
+            return False
+        self.size = (width, height)
+        if self.reference is not None:
+            ref_width, ref_height = self.reference
+            if (width > height) != (ref_width > ref_height):
+                logger.warning(f"화면 방향이 reference_size 와 다릅니다 (화면 {width}x{height}, "
+                               f"기준 {ref_width}x{ref_height})")
+            self.scale_x = round(width / ref_width, 4)
+            self.scale_y = round(height / ref_height, 4)
+            self.scale = round(min(self.scale_x, self.scale_y), 3)
+        return True
+
+    @property
+    def region_scale(self):
+        return self.scale_x, self.scale_y
+
+    def to_device(self, x, y):
+        """reference_size 기준 좌표를 기기 화면 좌표로 변환하는 함수"""
+        return int(round(x * self.scale_x)), int(round(y * self.scale_y))
+
+class ScaledTemplates:
+    """
+    TemplateRegistry 에서 기기 화면 배율에 맞는 참조 이미지를 꺼내는 클래스
+    (레지스트리는 여러 기기가 공유하고, 배율은 기기마다 다름)
+    """
+    def __init__(self, registry, scaler):
+        self.registry = registry
+        self.scaler = scaler
+
+    def path(self, name):
+        return self.registry.path(name)
+
+    def get(self, name):
+        template = self.registry.get(name)
+        if template is None:
+            return None
+        return template.at_scale(self.scaler.scale, self.scaler.region_scale)
+
+    def require(self, names):
+        self.registry.require(names)
+
+class ShellSession:
+    """
+    AdbDeviceTcp 위에 하나의 `shell:sh` 스트림을 열어두고
+    명령을 차례로 보내는 대화형 shell 세션
+    명령 뒤에 종료 표식을 출력하게 하여 명령별 출력을 구분
+    """
+    def __init__(self, device, read_timeout=10):
+        self.device = device
+        self.read_timeout = read_timeout
+        self.adb_info = None
+        self.buffer = bytearray()
+        self.counter = 0
+        # 마지막으로 실행한 명령의 종료 코드
+        self.last_status = None
+
+    def open(self):
+        self.adb_info = self.device._open(b'shell:sh', None, self.read_timeout, None)
+        self.buffer.clear()
+
+    def close(self):
+        if self.adb_info is None:
+            return
+        try:
+            self.device._clse(self.adb_info)
+        except Exception:
+            pass
+        self.adb_info = None
+
+    def _read(self):
+        # WRTE 패킷은 _read_until 이 OKAY 로 응답
+        cmd, data = self.device._read_until([adb_constants.WRTE, adb_constants.CLSE], self.adb_info)
+        if cmd == adb_constants.CLSE:
+            self.adb_info = None
+            raise ConnectionError("shell 세션이 기기에 의해 종료되었습니다")
+        self.buffer += data
+
+    def _write(self, data):
+        message = AdbMessage(adb_constants.WRTE, self.adb_info.local_id, self.adb_info.remote_id, data)
+        self.device._io_manager.send(message, self.adb_info)
+        # 기기가 OKAY 를 보내기 전에 출력(WRTE)이 먼저 올 수 있으므로 함께 수신
+        while True:
+            cmd, data = self.device._read_until(
+                [adb_constants.OKAY, adb_constants.WRTE, adb_constants.CLSE], self.adb_info)
+            if cmd == adb_constants.OKAY:
+                return
+            if cmd == adb_constants.CLSE:
+                self.adb_info = None
+                raise ConnectionError("shell 세션이 기기에 의해 종료되었습니다")
+            self.buffer += data
+
+    def run(self, command, decode=True):
+        """
+        세션에서 명령을 실행하고 출력을 반환하는 함수
+        
+        Raises:
+            BrokenPipeError: 명령을 보내기 전에 세션이 끊어진 경우 (다시 보내도 안전)
+            Exception: 명령을 보낸 뒤 실패한 경우
+        """
+        try:
+            if self.adb_info is None:
+                self.open()
+            self.counter += 1
+            marker = f'__RESEMARA_END_{self.counter}__'.encode()
+            # 출력이 줄바꿈으로 끝나지 않아도 표식이 항상 새 줄에서 시작하도록 앞에 줄바꿈을 붙이고,
+            # 명령의 종료 코드($?)는 다른 명령을 실행하기 전에 같은 printf 에서 출력
+            self._write(command.encode('utf8') + b"\nprintf '\\n%s %d\\n' " + marker + b' "$?"\n')
+        except Exception as e:
+            self.close()
+            raise BrokenPipeError(str(e))
+        
+        pattern = b'\n' + marker + b' '
+        searched = 0
+        while True:
+            index = self.buffer.find(pattern, searched)
+            if index >= 0:
+                end = self.buffer.find(b'\n', index + len(pattern))
+                if end >= 0:
+                    output = bytes(self.buffer[:index])
+                    status = bytes(self.buffer[index + len(pattern):end]).strip()
+                    self.last_status = int(status) if status.lstrip(b'-').isdigit() else None
+                    del self.buffer[:end + 1]
+                    return output.decode('utf8', 'backslashreplace') if decode else output
+            else:
+                # 새로 받은 부분만 다시 검색
+                searched = max(0, len(self.buffer) - len(pattern))
+            try:
+                self._read()
+            except Exception:
+                self.close()
+                raise
+
+class ShellSessionPool:
+    """
+    대화형 shell 세션 여러 개를 유지하며 명령을 나누어 실행하는 클래스
+    AdbDeviceTcp.shell 과 같은 형태로 사용할 수 있음
+    """
+    def __init__(self, device, size=1):
+        self.device = device
+        self.enabled = True
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(ShellSession(device))
+
+    def shell(self, command, decode=True):
+        """
+        명령을 실행하는 함수 (세션이 끊어져 있으면 다시 연결)
+        
+        Returns:
+            str, bytes: 명령 출력
+        """
+        if not self.enabled:
+            return self.device.shell(command, decode=decode)
+        
+        session = self.idle.get()
+        try:
+            for attempt in range(2):
+                try:
+                    return session.run(command, decode)
+                except BrokenPipeError as e:
+                    logger.debug(f"shell 세션 재연결 ({attempt + 1}/2): {str(e)}")
+            # 세션을 열 수 없는 기기는 이후 명령마다 새 스트림 사용
+            logger.warning("대화형 shell 세션을 사용할 수 없어 일반 shell 명령으로 전환합니다")
+            self.enabled = False
+            return self.device.shell(command, decode=decode)
+        finally:
+            self.idle.put(session)
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get().close()
+
+class AppTracker:
+    """
+    게임 패키지/액티비티를 한 번만 확인하여 기억하는 클래스
+    앱 종료/실행 때마다 dumpsys 를 실행하지 않도록 캐시하고,
+    실행 여부는 pidof 로 가볍게 확인
+    (설정에 패키지가 없으면 화면에서 확인하되, 런처/시스템 창은 게임으로 보지 않고
+    저장한 패키지가 실행 중이 아니거나 실행에 실패하면 다시 확인)
+    """
+    # 포커스가 있어도 게임이 아닌 패키지 (런처, 시스템 UI/대화상자, 에뮬레이터 자체 앱)
+    IGNORED_PACKAGES = re.compile(r'launcher|systemui|^android$|^com\.android\.|^com\.google\.android\.'
+                                  r'|^com\.mumu\.|^com\.netease\.nemu')
+
+    def __init__(self, shell, package=None, activity=None):
+        self.shell = shell
+        self.package = package or None
+        self.activity = activity or None
+        # 설정으로 지정한 패키지는 다시 확인하지 않음
+        self.configured = self.package is not None
+
+    @staticmethod
+    def parse_focus(result):
+        """
+        dumpsys window 의 mCurrentFocus 줄에서 패키지/액티비티를 추출하는 함수
+        (일반적인 형식: mCurrentFocus=Window{... u0 PackageName/ActivityName})
+        
+        Returns:
+            tuple: (패키지, 액티비티) (찾지 못하면 (None, None))
+        """
+        match = re.search(r'{\w+\s+\w+\s+(\S+)}', result or '')
+        if not match:
+            return None, None
+        package, _, activity = match.group(1).partition('/')
+        return package, activity or None
+
+    def query_focus(self):
+        """현재 포커스된 창의 (패키지, 액티비티)를 dumpsys 로 확인하는 함수"""
+        result = self.shell('dumpsys window | grep mCurrentFocus')
+        logger.debug(f"현재 창 정보: {result}")
+        return self.parse_focus(result)
+
+    def query_game(self):
+        """
+        현재 포커스된 창이 게임으로 볼 수 있는 앱이면 (패키지, 액티비티)를 반환하는 함수
+        
+        Returns:
+            tuple: (패키지, 액티비티) (런처/시스템 창이거나 찾지 못하면 (None, None))
+        """
+        package, activity = self.query_focus()
+        if package and self.IGNORED_PACKAGES.search(package):
+            logger.debug(f"게임이 아닌 창이므로 패키지로 사용하지 않습니다: {package}")
+            return None, None
+        return package, activity
+
+    def resolve(self):
+        """
+        게임 패키지 이름을 반환하는 함수 (처음 한 번만 dumpsys 로 확인)
+        
+        Returns:
+            str: 패키지 이름 (찾지 못한 경우 None)
+        """
+        if self.package is None:
+            package, activity = self.query_game()
+            if package:
+                self.package, self.activity = package, activity
+                logger.info(f"게임 패키지 확인: {package}" + (f"/{activity}" if activity else ""))
+        return self.package
+
+    def refresh(self):
+        """
+        저장한 패키지가 실행 중이 아닐 때 현재 창으로 다시 확인하는 함수
+        (처음 확인할 때 다른 앱이 포커스를 가지고 있었을 수 있으므로)
+        
+        Returns:
+            bool: 다른 패키지로 바뀌었는지 여부
+        """
+        if self.configured:
+            return False
+        package, activity = self.query_game()
+        if not package or package == self.package:
+            return False
+        logger.warning(f"게임 패키지를 다시 확인했습니다: {self.package} -> {package}")
+        self.package, self.activity = package, activity
+        return True
+
+    def forget(self):
+        """화면에서 확인한 패키지를 버리는 함수 (다음 앱 종료 시 다시 확인)"""
+        if not self.configured:
+            self.package = None
+            self.activity = None
+
+    def is_running(self):
+        """
+        게임 프로세스 실행 여부를 pidof 로 확인하는 함수
+        
+        Returns:
+            bool: 실행 여부 (pidof 를 사용할 수 없으면 None)
+        """
+        if self.package is None:
+            return None
+        output = self.shell(f'pidof {self.package}').strip()
+        if not output:
+            return False
+        if all(token.isdigit() for token in output.split()):
+            return True
+        logger.debug(f"pidof 사용 불가: {output}")
+        return None
+
+    def launch_command(self):
+        """
+        게임을 직접 실행하는 명령 (액티비티를 알면 am start, 모르면 monkey 로 런처 인텐트 실행)
+        
+        Returns:
+            str: shell 명령 (패키지를 모르면 None)
+        """
+        if self.package is None:
+            return None
+        if self.activity:
+            return f'am start -n {self.package}/{self.activity}'
+        return f'monkey -p {self.package} -c android.intent.category.LAUNCHER 1'
+
+    def launch(self):
+        """
+        게임을 직접 실행하는 함수 (아이콘 이미지 탐색 생략)
+        
+        Returns:
+            bool: 실행 확인 여부
+        """
+        command = self.launch_command()
+        if command is None:
+            return False
+        output = self.shell(command)
+        logger.debug(f"앱 실행 결과: {output.strip()}")
+        if 'Error' in output or 'No activities found' in output:
+            # 저장된 액티비티가 맞지 않으면 다음부터 런처 인텐트 사용
+            if self.activity:
+                logger.warning(f"액티비티 실행 실패, 런처 인텐트로 다시 시도합니다: {self.activity}")
+                self.activity = None
+                return self.launch()
+            return False
+        # 프로세스 생성까지 잠시 걸릴 수 있으므로 몇 번 확인
+        for _ in range(10):
+            running = self.is_running()
+            if running is None or running:
+                return True
+            time.sleep(0.2)
+        return False
+
+    def stop(self):
+        """게임을 강제 종료하는 함수"""
+        self.shell(f'am force-stop {self.package}')
+
+class SendeventTouch:
+    """
+    터치 입력 장치에 sendevent 로 직접 이벤트를 기록하는 클래스
+    input 명령(자바 프로세스 실행)을 거치지 않아 탭 지연이 짧음
+    """
+    # linux/input-event-codes.h
+    EV_SYN, EV_KEY, EV_ABS = 0, 1, 3
+    BTN_TOUCH = 330
+    ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TRACKING_ID = 53, 54, 57
+
+    def __init__(self, path, max_x, max_y, natural_size, rotation=0):
+        """
+        Args:
+            path (str): 터치 장치 경로 (예: /dev/input/event2)
+            max_x (int): ABS_MT_POSITION_X 최대값
+            max_y (int): ABS_MT_POSITION_Y 최대값
+            natural_size (tuple): 회전 전 화면 크기 (width, height)
+            rotation (int): 화면 회전 (0~3, 90도 단위)
+        """
+        self.path = path
+        self.max_x = max_x
+        self.max_y = max_y
+        self.natural_width, self.natural_height = natural_size
+        self.rotation = rotation
+        self.tracking_id = 0
+
+    @classmethod
+    def discover(cls, device):
+        """
+        getevent / wm size / dumpsys input 출력으로 터치 장치를 찾는 함수
+        
+        Returns:
+            SendeventTouch: 터치 장치 (찾지 못하면 None)
+        """
+        output = device.shell('getevent -pl')
+        path = None
+        ranges = {}
+        for line in output.splitlines():
+            match = re.match(r'add device \d+: (\S+)', line)
+            if match:
+                if 'ABS_MT_POSITION_X' in ranges and 'ABS_MT_POSITION_Y' in ranges:
+                    break
+                path, ranges = match.group(1), {}
+                continue
+            match = re.search(r'(ABS_MT_POSITION_[XY])\s*:.*max (\d+)', line)
+            if match:
+                ranges[match.group(1)] = int(match.group(2))
+        if path is None or 'ABS_MT_POSITION_X' not in ranges or 'ABS_MT_POSITION_Y' not in ranges:
+            return None
+        
+        match = re.search(r'Physical size: (\d+)x(\d+)', device.shell('wm size'))
+        if not match:
+            return None
+        natural_size = (int(match.group(1)), int(match.group(2)))
+        
+        match = re.search(r'SurfaceOrientation: (\d)', device.shell('dumpsys input | grep SurfaceOrientation'))
+        rotation = int(match.group(1)) if match else 0
+        
+        logger.debug(f"터치 장치: {path} (max {ranges['ABS_MT_POSITION_X']}x{ranges['ABS_MT_POSITION_Y']}, "
+                     f"화면 {natural_size}, 회전 {rotation})")
+        return cls(path, ranges['ABS_MT_POSITION_X'], ranges['ABS_MT_POSITION_Y'], natural_size, rotation)
+
+    def to_raw(self, x, y):
+        """화면 좌표를 터치 장치 좌표로 변환하는 함수"""
+        width, height = self.natural_width, self.natural_height
+        if self.rotation == 1:
+            x, y = width - y, x
+        elif self.rotation == 2:
+            x, y = width - x, height - y
+        elif self.rotation == 3:
+            x, y = y, height - x
+        raw_x = int(x * (self.max_x + 1) / width)
+        raw_y = int(y * (self.max_y + 1) / height)
+        return min(max(raw_x, 0), self.max_x), min(max(raw_y, 0), self.max_y)
+
+    def tap_commands(self, x, y):
+        """탭 한 번에 해당하는 sendevent 명령 목록"""
+        raw_x, raw_y = self.to_raw(x, y)
+        self.tracking_id = (self.tracking_id + 1) % 65536
+        events = [
+            (self.EV_ABS, self.ABS_MT_TRACKING_ID, self.tracking_id),
+            (self.EV_ABS, self.ABS_MT_POSITION_X, raw_x),
+            (self.EV_ABS, self.ABS_MT_POSITION_Y, raw_y),
+            (self.EV_KEY, self.BTN_TOUCH, 1),
+            (self.EV_SYN, 0, 0),
+            # 손가락 떼기 (toybox sendevent 는 값을 부호 있는 정수로 읽으므로 0xFFFFFFFF 대신 -1)
+            (self.EV_ABS, self.ABS_MT_TRACKING_ID, -1),
+            (self.EV_KEY, self.BTN_TOUCH, 0),
+            (self.EV_SYN, 0, 0),
+        ]
+        return [f'sendevent {self.path} {t} {c} {v}' for t, c, v in events]
+
+class InputBatch:
+    """
+    탭/스와이프/텍스트 입력과 대기를 모아 한 번의 shell 호출로 실행하기 위한 클래스
+    (sendevent 탭은 명령이 여러 개이므로 특히 효과가 큼)
+    대기는 기기에서 실행되므로 전체 대기 시간이 shell 응답 대기 시간(10초)보다 짧아야 함
+    
+    사용 예:
+        batch = InputBatch().tap(100, 200).delay(0.5).tap(100, 200)
+        macro.run_input(batch)
+    """
+    def __init__(self, touch=None):
+        """
+        Args:
+            touch (SendeventTouch): 지정하면 탭을 sendevent 로 기록
+        """
+        self.touch = touch
+        self.commands = []
+
+    def tap(self, x, y):
+        if self.touch is not None:
+            self.commands += self.touch.tap_commands(x, y)
+        else:
+            self.commands.append(f'input tap {x} {y}')
+        return self
+
+    def swipe(self, x1, y1, x2, y2, duration_ms=300):
+        self.commands.append(f'input swipe {x1} {y1} {x2} {y2} {duration_ms}')
+        return self
+
+    def text(self, value):
+        self.commands.append(f'input text {value}')
+        return self
+
+    def delay(self, seconds):
+        if seconds > 0:
+            self.commands.append(f'sleep {seconds}')
+        return self
+
+    def script(self):
+        return '; '.join(self.commands)
+
+class FrameArchiver:
+    """
+    디버깅용 캡처 화면을 백그라운드 스레드에서 저장하는 클래스
+    캡처 루프는 큐에 넣기만 하므로 디스크 쓰기/압축을 기다리지 않음
+    """
+    # 포트 없이 저장하던 이전 버전의 파일 이름 (screen_날짜_시각...)
+    LEGACY_NAME = re.compile(r'screen_\d{8}_\d{6}')
+
+    def __init__(self, folder='Row_Screen', prefix='screen', mode='all', every=10,
+                 image_format='png', max_files=30):
+        self.folder = folder
+        self.prefix = prefix
+        self.mode = mode
+        self.every = max(1, every)
+        self.image_format = image_format
+        self.max_files = max_files
+        self.count = 0
+        # failure 모드에서 실패 시점에 저장할 최근 화면들
+        self.recent = deque(maxlen=max_files)
+        # 저장한 파일 경로 (오래된 순) - 매번 폴더를 조회하지 않기 위함
+        # 이전 버전이 남긴 파일도 포함하여 가장 오래된 것부터 지움 (다른 포트의 파일은 제외)
+        self.saved = deque(sorted(
+            (os.path.join(folder, f) for f in os.listdir(folder)
+             if f.startswith(f"{prefix}_") or self.LEGACY_NAME.match(f)),
+            key=os.path.getmtime)) if os.path.isdir(folder) else deque()
+        self.queue = queue.Queue(maxsize=max_files)
+        self.thread = None
+        if mode != 'off':
+            self.thread = threading.Thread(target=self._run, name='FrameArchiver', daemon=True)
+            self.thread.start()
+
+    def add(self, frame):
+        """
+        캡처 화면을 저장 대상으로 등록하는 함수
+        (재사용 버퍼를 쓰는 BGR 대신 원본 픽셀만 보관하고 저장 스레드에서 변환)
+        
+        Args:
+            frame (Frame): 캡처 화면
+        """
+        if self.mode == 'off':
+            return
+        self.count += 1
+        item = (frame.time, frame.pixels, frame.order)
+        if self.mode == 'failure':
+            self.recent.append(item)
+        elif self.mode == 'all' or self.count % self.every == 0:
+            self._enqueue(item)
+
+    def mark_failure(self):
+        """이미지 탐색 실패 시 메모리에 보관한 최근 화면들을 저장하는 함수"""
+        if self.mode != 'failure':
+            return
+        while self.recent:
+            self._enqueue(self.recent.popleft())
+
+    def _enqueue(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # 저장이 밀리면 매칭 루프를 막지 않고 해당 화면은 버림
+            pass
+
+    def _run(self):
+        params = []
+        if self.image_format == 'png':
+            params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+        elif self.image_format == 'jpg':
+            params = [cv2.IMWRITE_JPEG_QUALITY, 85]
+        
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            timestamp, pixels, order = item
+            try:
+                name = time.strftime("%Y%m%d_%H%M%S", time.localtime(timestamp))
+                millis = int((timestamp % 1) * 1000)
+                filename = os.path.join(self.folder, f"{self.prefix}_{name}_{millis:03d}.{self.image_format}")
+                
+                code = Frame.BGR_CODES[order]
+                screen_bgr = pixels if code is None else cv2.cvtColor(pixels, code)
+                ok, encoded = cv2.imencode(f'.{self.image_format}', screen_bgr, params)
+                if ok:
+                    encoded.tofile(filename)
+                    self.saved.append(filename)
+                
+                # 스크린샷 파일 개수 관리
+                while len(self.saved) > self.max_files:
+                    old = self.saved.popleft()
+                    try:
+                        os.remove(old)
+                    except FileNotFoundError:
+                        # 이전 버전 파일은 다른 포트의 작업자가 먼저 지웠을 수 있음
+                        pass
+            except Exception as e:
+                logger.error(f"스크린샷 저장 중 오류 발생: {str(e)}")
+
+    def close(self, timeout=5):
+        """대기 중인 화면을 모두 저장한 뒤 저장 스레드를 종료하는 함수"""
+        if self.thread is None:
+            return
+        thread, self.thread = self.thread, None
+        self.mode = 'off'
+        self.queue.put(None)
+        thread.join(timeout)
+
+def signature_changed(a, b, threshold=3):
+    """
+    두 Frame.signature 사이에 변화가 있는지 확인하는 함수
+    작은 버튼이 나타나는 경우도 놓치지 않도록 평균이 아닌 칸별 최대 차이로 판단
+    """
+    if a is None or b is None or a.shape != b.shape:
+        return True
+    return int(np.abs(a - b).max()) > threshold
+
+def match_full(screen_bgr, template):
+    """
+    원본 해상도 TM_CCOEFF_NORMED 단일 탐색
+    
+    Returns:
+        tuple: (최고 매칭 점수, 좌상단 좌표)
+    """
+    result = cv2.matchTemplate(screen_bgr, template.bgr, cv2.TM_CCOEFF_NORMED, mask=template.mask)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_val, max_loc
+
+def match_pyramid(screen_bgr, template, scale=0.5, candidates=3, small_screen=None):
+    """
+    축소한 흑백 화면에서 후보 위치를 찾은 뒤 후보 주변만 원본 해상도로 다시 탐색
+    반환값은 match_full 과 같은 (점수, 좌상단 좌표) 형식
+    
+    Args:
+        screen_bgr (np.ndarray): BGR 화면 이미지
+        template (Template): 참조 이미지
+        scale (float): 축소 비율
+        candidates (int): 정밀 탐색할 후보 개수
+        small_screen (np.ndarray): 미리 축소한 흑백 화면 (없으면 screen_bgr 에서 계산)
+    """
+    small_template = template.scaled_gray(scale)
+    small_h, small_w = small_template.shape[:2]
+    # 너무 작게 축소되면 특징이 사라지므로 원본 탐색으로 대체
+    if min(small_h, small_w) < 8 or template.mask is not None:
+        return match_full(screen_bgr, template)
+    
+    if small_screen is None:
+        screen_gray = cv2.cvtColor(screen_bgr, cv2.COLOR_BGR2GRAY)
+        small_screen = cv2.resize(screen_gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if small_screen.shape[0] < small_h or small_screen.shape[1] < small_w:
+        return match_full(screen_bgr, template)
+    coarse = cv2.matchTemplate(small_screen, small_template, cv2.TM_CCOEFF_NORMED)
+    
+    screen_h, screen_w = screen_bgr.shape[:2]
+    # 흰 배경 위주의 대비가 낮은 참조 이미지는 축소 화면의 최고점이 몇 픽셀 어긋날 수 있으므로
+    # 참조 이미지 크기에 비례하는 여유를 두고 정밀 탐색
+    pad = int(np.ceil(1 / scale)) + 2 + min(template.width, template.height) // 4
+    best_val, best_loc = -1.0, (0, 0)
+    for _ in range(candidates):
+        _, peak_val, _, (px, py) = cv2.minMaxLoc(coarse)
+        if peak_val <= -1.0:
+            break
+        # 같은 후보가 다시 선택되지 않도록 주변을 지움
+        cv2.rectangle(coarse, (px - small_w // 2, py - small_h // 2),
+                      (px + small_w // 2, py + small_h // 2), -1.0, -1)
+        
+        x, y = int(px / scale), int(py / scale)
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1 = min(screen_w, x + template.width + pad)
+        y1 = min(screen_h, y + template.height + pad)
+        if x1 - x0 < template.width or y1 - y0 < template.height:
+            continue
+        
+        val, loc = match_full(screen_bgr[y0:y1, x0:x1], template)
+        if val > best_val:
+            best_val, best_loc = val, (loc[0] + x0, loc[1] + y0)
+    return best_val, best_loc
+
+class SearchRegionTracker:
+    """
+    참조 이미지별 탐색 영역을 관리하는 클래스
+    고정 영역(regions.json) 또는 이전에 발견된 위치 주변만 탐색하고,
+    찾지 못할 때마다 여유 폭을 두 배로 넓히다가 전체 화면까지 확인한 뒤 다시 좁힘
+    """
+    def __init__(self, mode='auto', margin=40, max_expand=3):
+        """
+        Args:
+            mode (str): 'off', 'static', 'auto'
+            margin (int): 탐색 영역 주변 기본 여유 픽셀
+            max_expand (int): 전체 화면 탐색 전까지 영역을 넓히는 횟수
+        """
+        self.mode = mode
+        self.margin = margin
+        self.max_expand = max_expand
+        self.boxes = {}    # 이름 -> 발견 위치를 모두 포함하는 (x0, y0, x1, y1)
+        self.expand = {}   # 이름 -> 연속 미발견 단계
+
+    def region_for(self, template, screen_shape):
+        """
+        이번 탐색에 사용할 영역을 반환하는 함수
+        
+        Returns:
+            tuple: (x0, y0, x1, y1) 화면 좌표 (전체 화면을 탐색해야 하면 None)
+        """
+        if self.mode == 'off':
+            return None
+        
+        box = None
+        if template.region is not None:
+            x, y, w, h = template.region
+            box = (x, y, x + w, y + h)
+        if self.mode == 'auto' and template.name in self.boxes:
+            learned = self.boxes[template.name]
+            box = learned if box is None else (
+                min(box[0], learned[0]), min(box[1], learned[1]),
+                max(box[2], learned[2]), max(box[3], learned[3]))
+        if box is None:
+            return None
+        
+        level = self.expand.get(template.name, 0)
+        if level > self.max_expand:
+            return None
+        
+        screen_h, screen_w = screen_shape[:2]
+        margin = self.margin * (2 ** level)
+        x0, y0 = max(0, box[0] - margin), max(0, box[1] - margin)
+        x1, y1 = min(screen_w, box[2] + margin), min(screen_h, box[3] + margin)
+        if x1 - x0 < template.width or y1 - y0 < template.height:
+            return None
+        return x0, y0, x1, y1
+
+    def record(self, template, max_loc, found):
+        """
+        매칭 결과를 반영하는 함수
+        
+        Args:
+            template (Template): 참조 이미지
+            max_loc (tuple): 화면 기준 좌상단 좌표
+            found (bool): 임계값 이상으로 발견했는지 여부
+        """
+        name = template.name
+        if found:
+            self.expand[name] = 0
+            if self.mode == 'auto':
+                x, y = max_loc
+                hit = (x, y, x + template.width, y + template.height)
+                box = self.boxes.get(name, hit)
+                self.boxes[name] = (
+                    min(box[0], hit[0]), min(box[1], hit[1]),
+                    max(box[2], hit[2]), max(box[3], hit[3]))
+        else:
+            # 전체 화면까지 확인한 다음에는 다시 좁은 영역부터 탐색
+            level = self.expand.get(name, 0) + 1
+            self.expand[name] = 0 if level > self.max_expand + 1 else level
+
+def create_match_pool(config, shared=False):
+    """
+    참조 이미지 매칭용 스레드 풀을 생성하는 함수
+    cv2.matchTemplate 은 실행 중 GIL 을 해제하므로 프로세스 풀 없이도 여러 코어를 사용
+    
+    Args:
+        config (dict): 설정값 (match_workers)
+        shared (bool): 여러 작업자가 함께 쓰는 풀인지 여부 (감독 모드)
+        
+    Returns:
+        ThreadPoolExecutor: 매칭 스레드 풀 (병렬 매칭을 사용하지 않으면 None)
+    """
+    workers = config['match_workers'] or os.cpu_count() or 1
+    if workers <= 1 and not shared:
+        return None
+    # 풀의 스레드마다 OpenCV 내부 스레드를 또 만들면 코어 수보다 많은 스레드가 경쟁하므로
+    # 매칭 병렬화는 풀에서만 수행 (프로세스 전체 설정이므로 단일 이미지 매칭도 한 스레드로 실행)
+    cv2.setNumThreads(1)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='Match')
+
+class ScenarioExit(Exception):
+    """시나리오를 중간에 끝내야 할 때 발생 (reason: 'goal' - 목표 캐릭터를 모두 얻음)"""
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+class DrawTally:
+    """계정 하나의 뽑기 결과 집계 (결과 화면에서 발견한 목표 캐릭터 횟수)"""
+    def __init__(self, targets, total_draws):
+        self.targets = list(targets)
+        self.total_draws = total_draws
+        self.started = datetime.now()
+        self.draws = 0
+        self.found = {name: 0 for name in self.targets}
+
+    def add(self, seen):
+        """뽑기 한 번의 결과를 추가하는 함수"""
+        self.draws += 1
+        for name in seen:
+            self.found[name] = self.found.get(name, 0) + 1
+
+    @property
+    def goal_met(self):
+        return all(self.found[name] > 0 for name in self.targets)
+
+    def to_dict(self):
+        return {'started': self.started.isoformat(timespec='seconds'), 'draws': self.draws,
+                'total_draws': self.total_draws, 'found': self.found}
+
+    @classmethod
+    def from_dict(cls, data, targets, total_draws):
+        """to_dict 로 저장한 집계를 복원하는 함수"""
+        tally = cls(targets, total_draws)
+        tally.started = datetime.fromisoformat(data['started'])
+        tally.draws = data['draws']
+        tally.found.update(data['found'])
+        return tally
+
+    def summary(self):
+        counts = ', '.join(f"{name} {count}" for name, count in self.found.items())
+        return f"뽑기 {self.draws}/{self.total_draws}회, {counts}"
+
+    def save(self, folder, result, port):
+        """
+        집계 결과를 계정 스크린샷과 같은 폴더에 저장하는 함수
+        
+        Args:
+            folder (str): 저장 폴더 (Accounts)
+            result (int): 최종 판단 (1: 종료, 2: 리셋)
+            port (int): ADB 포트 (여러 작업자가 같은 시각에 저장해도 겹치지 않도록 파일명에 포함)
+        """
+        name = self.started.strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(folder, f"tally_{port}_{name}.json")
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({**self.to_dict(), 'result': 'keep' if result == 1 else 'reset'},
+                          f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"뽑기 집계 저장 중 오류 발생: {str(e)}")
+
+# 스레드 ident -> ADB 포트 (작업자별 로그에 캡처/저장 등 보조 스레드의 로그도 함께 기록하기 위함)
+log_ports = {}
+
+def bind_log_port(port, thread=None):
+    """스레드(None이면 현재 스레드)의 로그를 port 작업자의 로그로 기록하도록 등록하는 함수"""
+    log_ports[(thread or threading.current_thread()).ident] = port
+
+def unbind_log_port(port):
+    """port 작업자에 등록된 스레드를 모두 해제하는 함수 (종료된 스레드의 ident 가 재사용될 수 있으므로)"""
+    for ident, bound in list(log_ports.items()):
+        if bound == port:
+            log_ports.pop(ident, None)
+
+def open_worker_log(port):
+    """
+    감독 모드에서 작업자 스레드의 로그만 따로 저장하는 핸들러를 추가하는 함수
+    (ReseMara.log 에는 모든 작업자의 로그가 섞이므로 계정 결과에는 이 파일을 복사)
+    
+    Returns:
+        logging.FileHandler: 추가한 핸들러 (baseFilename 이 로그 파일 경로)
+    """
+    handler = logging.FileHandler(f'ReseMara_{port}.log', mode='w', encoding='utf-8')
+    handler.setLevel(logging.DEBUG)
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s'))
+    handler.addFilter(lambda record: log_ports.get(record.thread) == port)
+    logger.addHandler(handler)
+    return handler
+
+def find_open_ports(ports, timeout=0.3):
+    """
+    ADB 포트가 열려 있는 에뮬레이터를 찾는 함수
+    (닫힌 포트마다 연결 시간 초과를 기다리지 않도록 모든 포트를 동시에 확인)
+    
+    Returns:
+        list: 연결 가능한 포트 목록 (ports 순서 유지)
+    """
+    def is_open(port):
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+    
+    if not ports:
+        return []
+    with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        return [port for port, ok in zip(ports, pool.map(is_open, ports)) if ok]
+
+class Supervisor:
+    """
+    한 프로세스에서 에뮬레이터마다 ReseMara 작업자 스레드를 실행하는 클래스
+    참조 이미지와 매칭 스레드 풀을 공유하고, 중단된 작업자는 다시 시작
+    (port.log 대신 프로세스 내부에서 포트 사용 현황을 관리)
+    """
+    def __init__(self, config, templates):
+        self.config = config
+        self.templates = templates
+        self.match_pool = create_match_pool(config, shared=True)
+        self.workers = {}   # 포트 -> 작업자 스레드
+        self.macros = {}    # 포트 -> 실행 중인 ReseMara
+        self.restarts = {}  # 포트 -> 재시작 횟수
+        self.logs = {}      # 포트 -> 작업자 로그 핸들러 (재시작해도 같은 파일에 이어서 기록)
+        self.finished = set()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def candidate_ports(self):
+        if self.config['adb_ports']:
+            return list(self.config['adb_ports'])
+        return [16384 + 32 * i for i in range(self.config['port_scan_count'])]
+
+    def discover(self, timeout=0.3):
+        """
+        ADB 포트가 열려 있는 에뮬레이터를 찾는 함수
+        
+        Returns:
+            list: 연결 가능한 포트 목록
+        """
+        alive = find_open_ports(self.candidate_ports(), timeout)
+        logger.debug(f"감지된 에뮬레이터 포트: {alive}")
+        return alive
+
+    def start_worker(self, port):
+        thread = threading.Thread(target=self._work, args=(port,), name=f'Worker-{port}', daemon=True)
+        with self.lock:
+            if port not in self.logs:
+                self.logs[port] = open_worker_log(port)
+            self.workers[port] = thread
+        thread.start()
+
+    def start_new_workers(self):
+        """
+        작업자가 없는 포트에서 새로 실행된 에뮬레이터를 찾아 작업자를 시작하는 함수
+        
+        Returns:
+            list: 새로 작업자를 시작한 포트 목록
+        """
+        with self.lock:
+            known = set(self.workers)
+        ports = [port for port in self.discover() if port not in known]
+        for port in ports:
+            logger.info(f"에뮬레이터 포트 {port} 감지, 작업자를 시작합니다")
+            self.start_worker(port)
+        return ports
+
+    def _work(self, port):
+        macro = None
+        bind_log_port(port)
+        try:
+            macro = ReseMara(port, self.config, self.templates, self.match_pool)
+            macro.log_path = self.logs[port].baseFilename
+            with self.lock:
+                self.macros[port] = macro
+            macro.run_macro()
+            with self.lock:
+                self.finished.add(port)
+            logger.info(f"포트 {port} 작업이 완료되었습니다")
+        except FATAL_ERRORS as e:
+            # 다시 시작해도 같은 오류가 나므로 재시작하지 않음
+            logger.error(f"포트 {port} 작업자가 복구할 수 없는 오류로 중지되었습니다: {str(e)}")
+            with self.lock:
+                self.finished.add(port)
+        except Exception as e:
+            logger.error(f"포트 {port} 작업자 중단: {str(e)}")
+        finally:
+            with self.lock:
+                self.macros.pop(port, None)
+            if macro is not None:
+                macro.close()
+            unbind_log_port(port)
+
+    def run(self, poll_interval=5):
+        """
+        감지된 모든 에뮬레이터에서 작업자를 실행하고 모두 끝날 때까지 감시하는 함수
+        (port_rescan_interval 마다 나중에 실행한 에뮬레이터도 찾아 작업자를 추가)
+        """
+        rescan_interval = self.config['port_rescan_interval']
+        self.start_new_workers()
+        last_scan = time.monotonic()
+        
+        while not self.stopping.is_set():
+            if rescan_interval and time.monotonic() - last_scan >= rescan_interval:
+                self.start_new_workers()
+                last_scan = time.monotonic()
+            
+            with self.lock:
+                dead = [port for port, thread in self.workers.items()
+                        if not thread.is_alive() and port not in self.finished]
+                running = [port for port, thread in self.workers.items() if thread.is_alive()]
+            
+            for port in dead:
+                count = self.restarts.get(port, 0)
+                if count >= self.config['max_restarts']:
+                    logger.error(f"포트 {port} 작업자가 재시작 한도를 초과하여 중지합니다")
+                    with self.lock:
+                        self.finished.add(port)
+                    continue
+                self.restarts[port] = count + 1
+                logger.info(f"포트 {port} 작업자 재시작 ({count + 1}/{self.config['max_restarts']})")
+                self.start_worker(port)
+            
+            if not running and not dead:
+                # 종료 전에 한 번 더 검색하여 그 사이 실행된 에뮬레이터가 없을 때만 종료
+                if not rescan_interval or not self.start_new_workers():
+                    break
+            self.stopping.wait(poll_interval)
+        
+        self.match_pool.shutdown(wait=False)
+        with self.lock:
+            logs = list(self.logs.values())
+            self.logs.clear()
+        for handler in logs:
+            logger.removeHandler(handler)
+            handler.close()
+
+    def discard_checkpoints(self):
+        """사용자가 종료할 때 실행 중인 모든 작업자의 진행 상태를 지우는 함수"""
+        with self.lock:
+            macros = list(self.macros.values())
+        for macro in macros:
+            macro.discard_checkpoint()
+
+    def stop(self):
+        self.stopping.set()
+        with self.lock:
+            macros = list(self.macros.values())
+        for macro in macros:
+            macro.close()
+
 def signal_handler(signum, frame):
     """시그널 핸들러"""
     logger.debug("시그널 핸들러 호출됨")
+    # 사용자가 직접 종료한 경우 다음 실행이 중간 단계로 건너뛰지 않도록 진행 상태 삭제
+    if 'supervisor' in globals() and supervisor is not None:
+        supervisor.discard_checkpoints()
+    if 'macro' in globals() and macro is not None:
+        macro.discard_checkpoint()
     cleanup()
     sys.exit(0)
 
@@ -94,11 +2132,12 @@ class ReseMara:
         if click_image is None:
             click_image = wait_image
         
-        # 이미지를 찾았을 때만 클릭 실행
-        if self.wait_for_image(wait_image):
-            if self.find_and_click(click_image):
+        # 이미지를 찾았을 때만 클릭 실행 (같은 이미지면 찾은 위치를 그대로 클릭)
+        found = self.wait_for_image(wait_image)
+        if found:
+            if self.find_and_click(click_image, match=found):
                 logger.info(f"{click_image} 버튼을 찾아 클릭했습니다")
-                time.sleep(wait_time)
+                self.settle(wait_time)
                 return True
             else:
                 logger.info(f"{click_image} 버튼 클릭에 실패했습니다")
@@ -107,6 +2146,70 @@ class ReseMara:
             logger.info(f"{wait_image} 이미지를 찾지 못해 다음 동작으로 어갑니다")
             return False
 
+    def macro_sequence_any(self, image_names, wait_time=5, timeout=20):
+        """여러 이미지 중 먼저 나타난 이미지를 찾아 클릭하는 시퀀스
+        
+        Args:
+            image_names (list): 대기할 이미지 이름 목록 (예: ["back_button", "back_button_other"])
+            wait_time (float): 클릭 후 대기 시간 (기본값: 5초)
+            timeout (float): 최대 대기 시간(초)
+            
+        Returns:
+            str: 클릭한 이미지 이름 (실패 시 None)
+        """
+        found, _ = self.wait_for_any(image_names, timeout=timeout)
+        if found is None:
+            logger.info(f"{', '.join(image_names)} 이미지를 찾지 못해 다음 동작으로 넘어갑니다")
+            return None
+        
+        matched = found.name
+        if self.find_and_click(matched, match=found):
+            logger.info(f"{matched} 버튼을 찾아 클릭했습니다")
+            self.settle(wait_time)
+            return matched
+        else:
+            logger.info(f"{matched} 버튼 클릭에 실패했습니다")
+            return None
+
+    def macro_batch_sequence(self, clicks, interval=1.0, wait_time=5):
+        """한 화면에 함께 보이는 버튼들을 정해진 횟수만큼 순서대로 클릭하는 시퀀스
+        첫 번째 버튼이 나타나면 같은 화면에서 나머지 버튼도 찾고,
+        모든 탭과 탭 사이 대기를 한 번의 shell 호출로 실행
+        
+        Args:
+            clicks (list): (이미지 이름, 클릭 횟수) 목록 (예: [("purchase_item_available", 5), ("gacha_item_confirm", 1)])
+            interval (float): 탭 사이 대기 시간(초)
+            wait_time (float): 클릭 후 대기 시간 (기본값: 5초)
+            
+        Returns:
+            bool: 시퀀스 성공 여부 (버튼이 하나라도 보이지 않으면 아무것도 클릭하지 않고 False)
+        """
+        names = [name for name, _ in clicks]
+        if not self.wait_for_image(names[0]):
+            logger.info(f"{names[0]} 이미지를 찾지 못해 다음 동작으로 넘어갑니다")
+            return False
+        
+        # 첫 번째 버튼을 찾은 화면에서 나머지 버튼 위치 확인
+        frame = self.last_frame
+        results = self.match_templates(frame, names)
+        missing = [name for name in names if name not in results or results[name][0] < 0.75]
+        if missing:
+            logger.info(f"{', '.join(missing)} 버튼이 같은 화면에 없어 한 번에 클릭하지 않습니다")
+            return False
+        
+        batch = self.input_batch()
+        for name, count in clicks:
+            score, loc = results[name]
+            center = MatchResult(self.templates.get(name), score, loc, frame, self.input_count).center
+            for _ in range(count):
+                if batch.commands:
+                    batch.delay(interval)
+                batch.tap(*center)
+        self.run_input(batch)
+        logger.info(f"{', '.join(f'{name} x{count}' for name, count in clicks)} 버튼을 한 번에 클릭했습니다")
+        self.settle(wait_time)
+        return True
+
     def macro_touch_sequence(self, x=300, y=300, wait_image=None, click_image=None, wait_time=5):
         """특정 좌표를 클릭한 후 이미지를 찾아 클릭하는 시퀀스
         
@@ -123,7 +2226,7 @@ class ReseMara:
         if click_image is None and wait_image is not None:
             click_image = wait_image
         
-        time.sleep(2)
+        self.settle(2, expected=[])
         self.click_position(x, y)
         
         if wait_image:
@@ -132,7 +2235,7 @@ class ReseMara:
                 self.click_position(x, y)
                 if self.find_and_click(click_image):
                     logger.info(f"{click_image} 버튼을 찾아 클릭했습니다")
-                    time.sleep(wait_time)
+                    self.settle(wait_time)
                     return True
                 else:
                     logger.info(f"{click_image} 버튼 클릭에 실패했습니다")
@@ -141,631 +2244,897 @@ class ReseMara:
                 logger.info(f"{wait_image} 이미지를 찾지 못 다음 동작으로 넘어갑니다")
                 return False
         else:
-            time.sleep(wait_time)
+            self.settle(wait_time)
             return True  # 이미지 검사가 없는 경우는 공으로 간주
 
-    def run_macro(self):
-        try:
-            # 기존의 반복적인 패턴을 macro_sequence로 변경
-            self.macro_sequence("app_icon")
-            if not self.macro_sequence("title_start"):
-                self.macro_sequence("title_start")
-            self.macro_sequence("guest_login")
-            #self.macro_sequence("guest_login_confirm")
-
-            # 컷신 스킵 시도 (실패시 재시도)
-            if not self.macro_touch_sequence(wait_image="first_cutscean", click_image="cutscene_skip"):
-                self.macro_touch_sequence(wait_image="cutscene_skip")
-            
-            # 튜토리얼 대사 시퀀스 1-4
-            self.macro_sequence("tuto_dialog_1")
-            self.macro_sequence("tuto_dialog_2")
-            self.macro_sequence("tuto_dialog_3")
-            self.macro_sequence("tuto_dialog_4")
-            
-            self.macro_sequence("tuto_action_1")
-            self.macro_sequence("tuto_dialog_5", "tuto_action_2")
-            self.macro_sequence("tuto_dialog_6", "tuto_action_3")
-            self.macro_sequence("tuto_dialog_7", "battle_confirm_button")
-            
-            # 튜대 8-9
-            self.macro_sequence("tuto_dialog_8")
-            self.macro_sequence("tuto_dialog_9")
-            
-            self.macro_touch_sequence(wait_image="cutscene_skip")
-            
-            # 튜토대사 10-17
-            self.macro_sequence("tuto_dialog_10")
-            self.macro_sequence("tuto_dialog_11")
-            self.macro_sequence("tuto_dialog_12")
-            self.macro_sequence("tuto_dialog_13")
-            self.macro_sequence("tuto_dialog_14")
-            self.macro_sequence("tuto_dialog_15")
-            self.macro_sequence("tuto_dialog_16")
-            
-            # 튜토행동 5-8
-            self.macro_sequence("tuto_dialog_17", "tuto_action_5")
-            self.macro_sequence("tuto_action_6", wait_time=5)
-            self.macro_sequence("tuto_action_7")
-            self.macro_sequence("tuto_action_8")
-            
-            self.macro_sequence("battle_confirm_button", wait_time=5)
-            
-            # 튜토대사 18-27
-            self.macro_sequence("tuto_dialog_18")
-            self.macro_sequence("tuto_dialog_19")
-            self.macro_sequence("tuto_dialog_20")
-            self.macro_sequence("tuto_dialog_21")
-            self.macro_sequence("tuto_dialog_22", wait_time=5)
-            self.macro_sequence("tuto_dialog_23")
-            self.macro_sequence("tuto_dialog_24")
-            self.macro_sequence("tuto_dialog_25")
-            self.macro_sequence("tuto_dialog_26")
-            self.macro_sequence("tuto_dialog_27")
-            
-            self.macro_touch_sequence(wait_image="cutscene_skip", wait_time=5)
-            self.macro_touch_sequence(wait_image="cutscene_skip", wait_time=5)
-
-            # 여 지휘관을 원하면 아래의 코드로 실행
-            #self.macro_touch_sequence(wait_image="nickname_creation_confirm", wait_time=5)
-            # 남지휘관 코드
-            self.macro_sequence("nickname_input_confirm")
-            self.macro_sequence("nickname_creation_confirm", wait_time=5)
-
-            self.macro_sequence("skip_after_creation")
-            self.macro_sequence("story_skip_confirm")
-
-
-            # 1-1 대 시퀀스
-            self.macro_sequence("1-1_dialog_1")
-            self.macro_sequence("1-1_dialog_2")
-            self.macro_sequence("1-1_dialog_3")
-            self.macro_sequence("1-1_dialog_4")
-            self.macro_sequence("1-1_dialog_5")
-            self.macro_sequence("1-1_dialog_6")
-            self.macro_sequence("1-1_dialog_7")
-            self.macro_sequence("1-1_dialog_8", "1-1_action_1")
-            self.macro_sequence("1-1_dialog_9", "1-1_action_2")
-            self.macro_sequence("1-1_dialog_10", "battle_confirm_button")
-
-            self.macro_sequence("1-1_dialog_11")
-            self.macro_sequence("1-1_action_3")
-            self.macro_sequence("battle_confirm_button")
-
-            self.macro_sequence("1-1_dialog_12", wait_time=5)
-            self.macro_sequence("dialog_skip_button", wait_time=5)
-            self.macro_sequence("1-1_dialog_13")
-            self.macro_sequence("1-1_dialog_14")
-            self.macro_sequence("1-1_dialog_15")
-            self.macro_sequence("1-1_dialog_16")
-            self.macro_sequence("1-1_dialog_17")
-            self.macro_sequence("1-1_dialog_18")
-            self.macro_sequence("1-1_dialog_19")
-            self.macro_sequence("1-1_dialog_20", "1-1_action_4")
-            self.macro_sequence("1-1_dialog_21", "1-1_action_5")
-            self.macro_sequence("1-1_dialog_22", "battle_confirm_button")
-            self.macro_sequence("1-1_dialog_23")
-            self.macro_sequence("1-1_dialog_24")
-            self.macro_sequence("1-1_dialog_25", "1-1_action_6")
-            self.macro_sequence("1-1_dialog_26")
-            self.macro_sequence("1-1_dialog_27", "1-1_action_13")
-            self.macro_sequence("battle_confirm_button", wait_time=5)
-            self.macro_sequence("1-1_action_7")
-            self.macro_sequence("battle_confirm_button", wait_time=5)
-            self.macro_sequence("1-1_action_8")
-            self.macro_sequence("battle_confirm_button", wait_time=5)
-            self.macro_sequence("1-1_dialog_28", wait_time=5)
-            self.macro_sequence("dialog_skip_button", wait_time=5)
-            self.macro_sequence("dialog_skip_button", wait_time=5)
-
-            self.macro_sequence("1-1_dialog_29")
-            self.macro_sequence("1-1_dialog_30")
-            self.macro_sequence("1-1_dialog_31")
-
-            self.macro_sequence("1-1_action_11", wait_time=5)
-            self.macro_sequence("1-1_action_11", wait_time=5)
-            self.macro_sequence("1-1_dialog_32")
-            self.macro_sequence("1-1_dialog_33")
-
-            self.macro_sequence("1-1_action_11", wait_time=5)
-            self.macro_sequence("1-1_action_11", wait_time=5)
-
-            if not self.macro_sequence("1-1_dialog_34"):
-                logger.info("클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("1-1_dialog_34")
-
-            self.macro_sequence("1-1_action_12")
-
-            self.macro_sequence("1-1_dialog_35")
-            self.macro_sequence("1-1_dialog_36", wait_time=5)
-
-            if not self.macro_sequence("level_up"):
-                logger.info("레벨업 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("level_up")
-                
-            if not self.macro_sequence("mission_complete"):
-                logger.info("미션컴플리트 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("level_up")
-                self.macro_sequence("mission_complete")
-
-            self.macro_sequence("stage_clear_confirm")
-            self.macro_touch_sequence(wait_image="cutscene_skip", wait_time=5)
-            self.macro_touch_sequence(wait_image="cutscene_skip", wait_time=5)
-            self.macro_sequence("dialog_skip_button")
-            self.macro_touch_sequence(wait_image="cutscene_skip", wait_time=5)
-
-            self.macro_sequence("lobby_event_screen")
-            self.macro_sequence("lobby_preparation")
-            self.macro_sequence("1st_stage_entry_confirm")
-
-            self.macro_sequence("1-2_stage_select")
-            self.macro_sequence("stage_entry")
-            self.macro_sequence("dialog_skip_button", wait_time=5)
-            self.macro_sequence("1-2_dialog_1")
-            self.macro_sequence("1-2_dialog_2")
-            self.macro_sequence("1-2_dialog_3")
-            self.macro_sequence("1-2_dialog_4")
-            self.macro_sequence("1-2_dialog_5")
-            self.macro_sequence("1-2_dialog_6")
-            self.macro_sequence("1-2_dialog_7")
-
-            self.macro_sequence("1-2_dialog_8")
-            self.macro_sequence("1-2_dialog_9")
-            self.macro_sequence("1-2_dialog_10", "1-2_action_1")
-            self.macro_sequence("1-2_dialog_11", "1-2_action_2")
-            self.macro_sequence("1-2_dialog_12", "1-2_action_3")
-            self.macro_sequence("1-2_dialog_13", "1-2_action_2")
-            self.macro_sequence("1-2_dialog_14", "1-2_action_4")
-            self.macro_sequence("1-2_dialog_15", "auto_stage", wait_time=20)
-            self.macro_sequence("1-2_dialog_16", wait_time=10)
-
-            if not self.macro_sequence("level_up"):
-                logger.info("레벨업 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("level_up")
-
-            if not self.macro_sequence("mission_complete"):
-                logger.info("미션컴플리트 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("level_up")
-                self.macro_sequence("mission_complete")
-            
-            self.macro_sequence("stage_clear_confirm_small")
-            self.macro_sequence("dialog_skip_button", wait_time=5)
-
-            self.macro_sequence("1-3_stage_select")
-            self.macro_sequence("stage_entry") # 여기서부터 재검해야함
-            self.macro_sequence("1-3_dialog_1")
-            self.macro_sequence("1-3_dialog_2", wait_time=5)
-            self.macro_sequence("1-3_dialog_3")
-            self.macro_sequence("1-3_dialog_4")
-            self.macro_sequence("1-3_dialog_5")
-            self.macro_sequence("1-3_dialog_6")
-            self.macro_sequence("1-3_dialog_7")
-            #self.macro_touch_sequence(wait_image="cutscene_skip", wait_time=5)
-
-            #self.macro_sequence("skip_notification_popup")
-            #self.macro_sequence("skip_popup_check_done", "skip_done_confirm")
-            # 디버깅용 스탑포인트
-            #wait_for_user_input()
-            self.macro_sequence("1-3_action_1", wait_time=7)
-            self.click_position(100, 450, wait_time=8)
-            self.macro_sequence("auto_stage", wait_time=15)
-            self.macro_sequence("1-3_dialog_8")
-            
-            if not self.macro_sequence("1-3_action_3", wait_time=5):
-                logger.info("1-3_action_3 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("1-3_action_3", wait_time=5)
-
-            self.macro_sequence("1-3_dialog_9")
-
-            if not self.macro_sequence("level_up"):
-                logger.info("레벨업 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("level_up")
-                
-            if not self.macro_sequence("mission_complete"):
-                logger.info("미션컴플리트 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("level_up")
-                self.macro_sequence("mission_complete")
-            self.macro_sequence("stage_clear_confirm")
-
-            self.macro_sequence("sl-1-1_stage_select")
-            self.macro_sequence("story_stage_view")
-            self.macro_sequence("dialog_skip_button", wait_time=5)
-            self.macro_sequence("empty_area_touch")
-
-            self.macro_sequence("1-4_stage_select")
-            self.macro_sequence("stage_entry")
-            self.macro_sequence("dialog_skip_button", wait_time=5)
-            self.macro_sequence("1-4_dialog_1")
-            self.macro_sequence("1-4_dialog_2")
-            self.macro_sequence("1-3_action_1")
-            self.macro_sequence("auto_stage", wait_time=25)
-
-            if not self.macro_sequence("level_up"):
-                logger.info("레벨업 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("level_up")
-                
-            if not self.macro_sequence("mission_complete"):
-                logger.info("미션컴플리트 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("level_up")
-                self.macro_sequence("mission_complete")
-
-            self.macro_sequence("stage_clear_confirm")
-
-            self.macro_sequence("sl-1-2_stage_select")
-            self.macro_sequence("story_stage_view")
-            self.macro_sequence("dialog_skip_button", wait_time=5)
-            self.macro_sequence("empty_area_touch")
-
-            self.macro_sequence("recruit_dialog_1", "lobby_button", wait_time=10)
-            self.macro_sequence("empty_area_touch")
-            if not self.macro_sequence("recruit_dialog_2", "recruit_button"):
-                logger.info("recruit_dialog_2 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("empty_area_touch")
-                self.macro_sequence("recruit_dialog_2", "recruit_button")
-            self.macro_sequence("recruit_dialog_3", "recruit_action_3")
-            self.macro_sequence("recruit_dialog_4", "recruit_action_4")
-            if not self.macro_touch_sequence(wait_image="gacha_preview_skip", wait_time=20):
-                logger.info("gacha_preview_skip 클릭 실패, 재시도")
-                time.sleep(5)
-                self.click_position(100, 400, wait_time=20)
-            if not self.macro_touch_sequence(wait_image="gacha_result_close", wait_time=5):
-                logger.info("gacha_result_close 클릭 실패, 재시도")
-                time.sleep(5)
-                self.click_position(100, 400, wait_time=5)
-                self.macro_touch_sequence(wait_image="gacha_result_close", wait_time=5)
-            if not self.macro_sequence("recruit_dialog_5", "lobby_button"):
-                logger.info("lobby_button 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("lobby_button_other")
-
-            self.macro_sequence("recruit_dialog_6", "maintenance_button")
-            self.macro_touch_sequence(wait_image="cutscene_skip", wait_time=5)
-            self.macro_sequence("maintenance_tutorial_skip")
-            if not self.macro_sequence("lobby_button"):
-                logger.info("lobby_button 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("lobby_button_other")
-
-            # self.macro_sequence("lobby_preparation")
-            # self.macro_sequence("1st_stage_entry_confirm")
-
-            # self.macro_sequence("1-5_stage_select")
-            # self.macro_sequence("stage_entry")
-            # self.macro_sequence("1-5_dialog_1")
-            # self.macro_sequence("1-5_dialog_2")
-            # self.macro_sequence("1-3_action_1", wait_time=5)
-            # self.macro_sequence("1-5_dialog_3")
-            # self.macro_sequence("1-5_dialog_4")
-            # self.macro_sequence("1-5_dialog_5")
-            # self.macro_sequence("1-3_action_3")
-            # self.macro_sequence("auto_stage", wait_time=20)
-
-            # if not self.macro_sequence("level_up"):
-            #     logger.info("레벨업 클릭 실패, 재시도")
-            #     time.sleep(2)
-            #     self.macro_sequence("level_up")
+    def settle(self, max_wait, expected=None):
+        """
+        동작 후 대기하는 함수
+        adaptive_wait 설정 시 max_wait 는 상한으로만 사용하고,
+        화면이 바뀐 뒤 안정되거나 다음 이미지가 나타나면 바로 반환
+        
+        Args:
+            max_wait (float): 최대 대기 시간(초)
+            expected (list): 나타나면 바로 진행할 이미지 이름 목록 (None이면 시나리오의 다음 단계 이미지)
+        """
+        if not self.config['adaptive_wait'] or max_wait <= 0:
+            time.sleep(max_wait)
+            return
+        
+        if expected is None:
+            expected = self.next_images
+        elapsed = self.wait_for_screen_settle(max_wait, expected)
+        logger.debug(f"적응형 대기: {elapsed:.2f}초 (상한 {max_wait}초)")
+
+    def wait_for_change(self, timeout, baseline=None):
+        """
+        화면이 바뀔 때까지 대기하는 함수 (로딩 / 컷신 / 앱 재시작 대기 등)
+        
+        Args:
+            timeout (float): 최대 대기 시간(초)
+            baseline (Frame): 비교할 화면 (None이면 마지막으로 캡처한 화면)
+            
+        Returns:
+            Frame: 바뀐 화면 (timeout 까지 바뀌지 않으면 None)
+        """
+        signature = baseline.signature if baseline is not None else self.last_signature
+        if signature is None:
+            signature = self.capture_screen().signature
+        
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            time.sleep(self.config['settle_poll'])
+            try:
+                frame = self.capture_screen()
+            except Exception:
+                continue
+            if signature_changed(frame.signature, signature, self.config['change_threshold']):
+                logger.debug(f"화면 변화 감지 ({time.time() - start_time:.2f}초)")
+                return frame
+        return None
+
+    def wait_for_screen_settle(self, max_wait, expected=(), threshold=0.75):
+        """
+        직전 캡처 화면과 비교하여 화면이 바뀐 뒤 안정될 때까지 대기하는 함수
+        
+        Returns:
+            float: 실제 대기한 시간(초)
+        """
+        baseline = self.last_signature
+        previous = baseline
+        changed = False
+        stable_since = None
+        start_time = time.time()
+        
+        while True:
+            time.sleep(self.config['settle_poll'])
+            now = time.time()
+            if now - start_time >= max_wait:
+                return now - start_time
+            
+            try:
+                frame = self.capture_screen()
+            except Exception:
+                continue
+            signature = self.last_signature
+            
+            if not changed:
+                changed = signature_changed(signature, baseline, self.config['change_threshold'])
+            
+            if changed:
+                # 다음 단계 이미지가 이미 보이면 안정될 때까지 기다리지 않음
+                if expected:
+                    results = self.match_templates(frame, expected, threshold)
+                    if any(max_val >= threshold for max_val, _ in results.values()):
+                        return time.time() - start_time
                 
-            # if not self.macro_sequence("mission_complete"):
-            #     logger.info("션컴플리트 클릭 실패, 재도")
-            #     time.sleep(2)
-            #     self.macro_sequence("level_up")
-            #     self.macro_sequence("mission_complete")
-
-            # self.macro_sequence("1-5_dialog_6" ,"stage_clear_confirm")
-            # self.macro_sequence("dialog_skip_button", wait_time=5)
-            # self.macro_sequence("weapon_tutorial_skip")
-            # if not self.macro_sequence("lobby_button"):
-            #     logger.info("lobby_button 클릭 실패, 재시도")
-            #     time.sleep(2)
-            #     self.macro_sequence("lobby_button_other")
-            # self.macro_sequence("empty_area_touch")
-            # self.macro_sequence("1-3_action_3")
-
-            # self.macro_sequence("beppo_reward_popup")
-            # self.macro_sequence("beppo_reward_popup_receive")
-            # self.macro_sequence("empty_area_touch")
-            # self.macro_sequence("back_button")
-
-            self.macro_sequence("mail_button")
-            self.macro_sequence("mail_all_receive", wait_time=15)
-            self.click_position(100, 450, wait_time=5)
-            if not self.macro_touch_sequence(wait_image="empty_area_touch", wait_time=5):
-                logger.info("empty_area_touch 클릭 실패, 재시도")
-                time.sleep(2)
-                self.click_position(100, 450, wait_time=5)
-                self.macro_sequence("empty_area_touch", wait_time=5)
-            if not self.macro_sequence("back_button"):
-                logger.info("back_button 릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("back_button_other")
-
-            # 초보자뽑기 40연차
-            self.macro_sequence("recruit_button")
-            self.macro_sequence("beginner_draw_10_times", wait_time=5)
-            self.close_current_app()
-            time.sleep(10)
-            self.macro_sequence("app_icon")
-            if not self.macro_sequence("title_start", wait_time=5):
-                logger.info("title_start 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("title_start", wait_time=5)
-            # 초보자뽑기 10연차
-            self.macro_sequence("recruit_button")
-            self.macro_sequence("beginner_draw_10_times", wait_time=5)
-            self.close_current_app()
-            time.sleep(10)
-            self.macro_sequence("app_icon")
-            if not self.macro_sequence("title_start", wait_time=5):
-                logger.info("title_start 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("title_start", wait_time=5)
-            #
-            self.macro_sequence("recruit_button")
-            self.macro_sequence("beginner_draw_10_times", wait_time=5)
-            self.close_current_app()
-            time.sleep(10)
-            self.macro_sequence("app_icon")
-            if not self.macro_sequence("title_start", wait_time=5):
-                logger.info("title_start 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("title_start", wait_time=5)
-            # 초보자뽑기 30연차
-            self.macro_sequence("recruit_button")
-            self.macro_sequence("beginner_draw_10_times", wait_time=5)
-            self.close_current_app()
-            time.sleep(10)
-            self.macro_sequence("app_icon")
-            if not self.macro_sequence("title_start", wait_time=5):
-                logger.info("title_start 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("title_start", wait_time=5)
-            # 초보자뽑기 40연차
-            self.macro_sequence("recruit_button")
-            self.macro_sequence("beginner_draw_10_times", wait_time=5)
-            self.close_current_app()
-            time.sleep(10)
-            self.macro_sequence("app_icon")
-            if not self.macro_sequence("title_start", wait_time=5):
-                logger.info("title_start 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("title_start", wait_time=5)
-            # 초보자뽑기 50연차 완료
-
-            self.macro_sequence("recruit_button")
-            self.macro_sequence("gacha_shop")
-            self.macro_sequence("pickup_item_purchase")
-            self.macro_sequence("purchase_item_available")
-            self.macro_sequence("purchase_item_available")
-            self.macro_sequence("purchase_item_available")
-            self.macro_sequence("purchase_item_available")
-            self.macro_sequence("purchase_item_available")
-            self.macro_sequence("gacha_item_confirm")
-            self.macro_sequence("empty_area_touch")
-            if not self.macro_sequence("back_button"):
-                logger.info("back_button 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("back_button_other")
-            self.macro_sequence("number_of_items")
-            self.macro_sequence("pickup_10_times", wait_time=3)
-            #self.macro_sequence("gacha_item_confirm", wait_time=5)
-            self.close_current_app()
-            time.sleep(5)
-            self.macro_sequence("app_icon", wait_time=5)
-            if not self.macro_sequence("title_start", wait_time=5):
-                logger.info("title_start 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("title_start", wait_time=5)
-
-            self.macro_sequence("maintenance_button")
-            self.macro_sequence("maintenance_list_expand", wait_time=5)
-
-            # 이미지 교 및 용자 선택 처리
-            choice = self.compare_images("suomi", "kyeongu")
-            if choice == 1:
-                logger.info("목표 달성하여 매크로 종료를 선택했습니다.")
+                # 재매칭 생략과 같은 기준 사용 (깜빡이는 작은 요소도 변화로 봄)
+                if not signature_changed(signature, previous, self.config['change_threshold']):
+                    if stable_since is None:
+                        stable_since = now
+                    elif now - stable_since >= self.config['settle_time']:
+                        return time.time() - start_time
+                else:
+                    stable_since = None
+            previous = signature
+
+    def run_macro(self):
+        # 오류가 나도 사용자 확인 후 저장된 진행 상태에서 이어서 진행 (최대 max_retries 번)
+        # 다시 시도해도 같은 오류가 나는 경우(FATAL_ERRORS)는 바로 호출한 쪽으로 전달
+        retries = 0
+        while True:
+            try:
+                self._run_accounts()
                 return
-            elif choice == 2:
+            except FATAL_ERRORS:
+                raise
+            except Exception as e:
+                logger.error(f"매크로 실행 중 오류 발생: {str(e)}")
+                if self.config['checkpoint'] and retries >= self.config['max_retries']:
+                    logger.error(f"재시도 한도({self.config['max_retries']}회)를 초과하여 매크로를 중지합니다.")
+                    raise
+                wait_for_user_input()
+                if not self.config['checkpoint']:
+                    return
+                retries += 1
+                logger.info(f"저장된 진행 상태에서 매크로를 다시 시작합니다. ({retries}/{self.config['max_retries']})")
+
+    def _run_accounts(self):
+        """목표를 달성할 때까지 계정 진행 → 결과 확인 → 리셋을 반복하는 함수"""
+        # 실행 도중 멈추지 않도록 참조 이미지 누락 여부를 먼저 확인
+        self.templates.require(scenario_templates(MACRO_SCENARIO + RESET_SCENARIO) + TARGET_IMAGES)
+        
+        phase, start = self.resume_position()
+        
+        # 리셋 후 재시작도 재귀 호출 없이 반복문으로 처리
+        while True:
+            if phase in ('macro', 'check'):
+                try:
+                    self.run_phase(phase, start)
+                except ScenarioExit:
+                    # 결과 화면에서 목표를 모두 확인하면 남은 뽑기를 건너뛰고 보유 목록에서 최종 확인
+                    logger.info(f"목표 캐릭터를 모두 얻어 남은 뽑기를 건너뜁니다 ({self.tally.summary()})")
+                    self.run_phase('check')
+                
+                # 이미지 비교 및 사용자 선택 처리
+                choice = self.compare_images(*TARGET_IMAGES)
+                logger.info(f"뽑기 집계: {self.tally.summary()}")
+                self.tally.save('Accounts', choice, self.port)
+                if choice != 2:
+                    self.clear_checkpoint()
+                    logger.info("목표 달성하여 매크로 종료를 선택했습니다.")
+                    return
                 logger.info("계정 리셋을 시작합니다.")
-                self.reset_account()
-                self.run_macro()  # 매크로 재시작
+                start = 0
             
+            self.reset_account(start)
+            self.tally = DrawTally(TARGET_IMAGES, scenario_count(MACRO_SCENARIO, 'result'))
+            phase, start = 'macro', 0
+
+    def reset_account(self, start=0):
+        """
+        계정 리셋을 위한 함수
+        """
+        self.run_phase('reset', start)
+
+    """==========[ 진행 상태 저장 ]=========="""
+    # 진행 단계 이름 -> 시나리오
+    PHASES = {
+        'macro': MACRO_SCENARIO,
+        'check': RESULT_CHECK,
+        'reset': RESET_SCENARIO,
+    }
+
+    def run_phase(self, phase, start=0):
+        """
+        진행 단계(phase)의 시나리오를 실행하며 단계마다 진행 상태를 저장하는 함수
+        
+        Args:
+            phase (str): 'macro', 'check', 'reset'
+            start (int, list): 시작 위치 (run_scenario 참고)
+        """
+        self.phase = phase
+        try:
+            self.run_scenario(self.PHASES[phase], start)
+        finally:
+            self.phase = None
+
+    def checkpoint_path(self):
+        return os.path.join(self.config['checkpoint_dir'], f"checkpoint_{self.port}.json")
+
+    def save_checkpoint(self):
+        """현재 진행 위치와 뽑기 집계를 저장하는 함수 (저장 중 종료되어도 파일이 깨지지 않도록 교체 방식)"""
+        if not self.config['checkpoint'] or self.phase is None or self.checkpoint_discarded:
+            return
+        path = self.checkpoint_path()
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'phase': self.phase, 'position': self.position, 'tally': self.tally.to_dict(),
+                           'updated': datetime.now().isoformat(timespec='seconds')}, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
         except Exception as e:
-            logger.error(f"매크로 실행 중 오류 발생: {str(e)}")
-            wait_for_user_input()
+            logger.error(f"진행 상태 저장 중 오류 발생: {str(e)}")
+
+    def load_checkpoint(self):
+        """
+        저장된 진행 상태를 읽는 함수
+        
+        Returns:
+            dict: 진행 상태 (없거나 읽을 수 없으면 None)
+        """
+        path = self.checkpoint_path()
+        if not self.config['checkpoint'] or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint['phase'] not in self.PHASES:
+                raise ValueError(f"알 수 없는 진행 단계: {checkpoint['phase']}")
+            # 이전 세션에서 남은 진행 상태로 중간 단계부터 시작하지 않도록 오래된 상태는 버림
+            max_age = self.config['checkpoint_max_age']
+            age = (datetime.now() - datetime.fromisoformat(checkpoint['updated'])).total_seconds()
+            if max_age and age > max_age:
+                logger.info(f"오래된 진행 상태를 버리고 새로 시작합니다 ({checkpoint['updated']})")
+                self.clear_checkpoint()
+                return None
+            return checkpoint
+        except Exception as e:
+            logger.error(f"진행 상태 읽기 실패: {str(e)}")
+            return None
+
+    def clear_checkpoint(self):
+        path = self.checkpoint_path()
+        if os.path.exists(path):
+            os.remove(path)
+
+    def discard_checkpoint(self):
+        """사용자가 직접 종료할 때 진행 상태를 지우고 이후로는 저장하지 않는 함수"""
+        self.checkpoint_discarded = True
+        try:
+            self.clear_checkpoint()
+        except Exception as e:
+            logger.error(f"진행 상태 삭제 중 오류 발생: {str(e)}")
+
+    def position_on_screen(self, steps, position, threshold=0.75):
+        """
+        저장된 진행 위치의 화면이 지금 보이는지 확인하는 함수
+        해당 단계부터 처음으로 참조 이미지를 사용하는 단계의 이미지를 기준으로 하고
+        (좌표 탭 등 이미지가 없는 단계는 다음 단계의 이미지로 확인)
+        화면 전환 중일 수 있으므로 resume_confirm 장 중 한 장에서라도 보이면 인정
+        
+        Returns:
+            bool: 저장된 위치의 화면인지 여부
+        """
+        names = []
+        for step in steps[position[0]:]:
+            names = scenario_templates([step])
+            if names:
+                break
+        if not names:
+            return True
+        try:
+            for attempt in range(max(1, self.config['resume_confirm'])):
+                if attempt > 0:
+                    time.sleep(self.config['settle_poll'])
+                results = self.match_templates(self.capture_screen(), names, threshold)
+                if any(max_val >= threshold for max_val, _ in results.values()):
+                    return True
+        except Exception as e:
+            logger.error(f"저장된 진행 위치 확인 중 오류 발생: {str(e)}")
+        return False
+
+    def resume_position(self):
+        """
+        시작할 진행 단계와 위치를 정하는 함수
+        저장된 진행 상태가 있으면 뽑기 집계를 복원하고, 저장된 위치의 화면이 보일 때만 그 위치부터 시작
+        (다른 화면이면 현재 화면에서 인식한 단계, 인식하지 못하면 해당 진행 단계의 처음부터 시작)
+        
+        Returns:
+            tuple: (진행 단계, 시작 위치)
+        """
+        total_draws = scenario_count(MACRO_SCENARIO, 'result')
+        self.tally = DrawTally(TARGET_IMAGES, total_draws)
+        checkpoint = self.load_checkpoint()
+        
+        if checkpoint is None:
+            detected = self.detect_scenario_step(MACRO_SCENARIO) if self.config['resume_from_screen'] else 0
+            return 'macro', detected
+        
+        phase, position = checkpoint['phase'], checkpoint['position']
+        if phase != 'reset':
+            self.tally = DrawTally.from_dict(checkpoint['tally'], TARGET_IMAGES, total_draws)
+        
+        if self.position_on_screen(self.PHASES[phase], position):
+            logger.info(f"저장된 진행 상태에서 이어서 진행합니다: {phase} 단계 {position[0] + 1} "
+                        f"({checkpoint['updated']}, {self.tally.summary()})")
+            return phase, position
+        
+        detected = self.detect_scenario_step(MACRO_SCENARIO)
+        if detected > 0:
+            # 리셋 단계였다면 화면에서 인식한 단계는 새 계정의 진행 위치
+            if phase == 'reset':
+                self.tally = DrawTally(TARGET_IMAGES, total_draws)
+            logger.info(f"저장된 진행 상태({phase} 단계 {position[0] + 1})의 화면이 아니므로 "
+                        f"현재 화면에서 인식한 단계 {detected + 1}부터 진행합니다")
+            return 'macro', detected
+        
+        # 결과 확인/리셋 단계는 처음부터 다시 진행하고, 계정 진행은 새 계정으로 처음부터 진행
+        logger.info(f"저장된 진행 상태({phase} 단계 {position[0] + 1})의 화면이 아니므로 "
+                    f"{phase} 단계를 처음부터 진행합니다")
+        if phase == 'macro':
+            self.tally = DrawTally(TARGET_IMAGES, total_draws)
+        return phase, 0
+
+    """==========[ 시나리오 실행 ]=========="""
+    def run_scenario(self, steps, start=0):
+        """
+        시나리오 단계 목록을 순서대로 실행하는 함수
+        
+        Args:
+            steps (list): scenario.py 에 정의된 단계 목록
+            start (int, list): 시작할 단계 번호
+                               (list 이면 [단계 번호, 반복 횟수, 반복 안의 단계 번호, ...] 형식의 진행 위치)
+        """
+        start = list(start) if isinstance(start, (list, tuple)) else [start]
+        index, resume = start[0], start[1:]
+        while index < len(steps):
+            logger.debug(f"단계 {index + 1}/{len(steps)}: {step_name(steps[index])}")
+            # 적응형 대기가 다음 단계 이미지를 기준으로 조기 종료할 수 있도록 전달
+            following = steps[index + 1:index + 2]
+            self.next_images = scenario_templates(following)[:1] if following else []
+            self.position.append(index)
+            try:
+                self.save_checkpoint()
+                self.run_step(steps[index], resume)
+            finally:
+                self.position.pop()
+            resume = []
+            index += 1
+
+    def run_step(self, step, resume=()):
+        """
+        시나리오 단계 하나를 실행하는 함수 (실패 시 retry / on_fail 처리)
+        
+        Args:
+            step (dict): 실행할 단계
+            resume (list): repeat 단계를 중간부터 이어서 실행할 위치 ([반복 횟수, 반복 안의 단계 번호, ...])
+        
+        Returns:
+            bool: 단계 성공 여부
+        """
+        start = time.perf_counter()
+        success = self._run_step_once(step, resume)
+        
+        retries = step.get('retry', 0)
+        on_fail = step.get('on_fail', [])
+        while not success and (retries > 0 or on_fail):
+            logger.info(f"{step_name(step)} 클릭 실패, 재시도")
+            time.sleep(step['retry_delay'])
+            if on_fail:
+                for fallback in on_fail:
+                    success = self.run_step(fallback)
+                on_fail = []
+            else:
+                success = self._run_step_once(step)
+                retries -= 1
+        metrics.record('step', step_name(step), time.perf_counter() - start, port=self.port, success=bool(success))
+        return success
+
+    def _run_step_once(self, step, resume=()):
+        op = step['op']
+        if op == 'seq':
+            return self.macro_sequence(step['wait'], step['click'], step['wait_time'])
+        if op == 'touch':
+            return self.macro_touch_sequence(step['x'], step['y'], step['wait'], step['click'], step['wait_time'])
+        if op == 'batch':
+            return self.macro_batch_sequence(step['clicks'], step['interval'], step['wait_time'])
+        if op == 'any':
+            matched = None
+            for _ in range(step['max_loops']):
+                matched = self.macro_sequence_any(step['images'], step['wait_time'])
+                # until 이미지가 나올 때까지는 찾지 못해도 다시 기다림
+                if step['until'] is None or matched == step['until']:
+                    break
+            return matched is not None and (step['until'] is None or matched == step['until'])
+        if op == 'tap':
+            return self.click_position(step['x'], step['y'], wait_time=step['wait_time'])
+        if op == 'launch':
+            return self.launch_app(step['icon'], step['wait_time'])
+        if op == 'close_app':
+            success = self.close_current_app()
+            self.settle(step['wait_time'])
+            return success
+        if op == 'text':
+            return self.input_text_via_adb(step['text'])
+        if op == 'result':
+            self.watch_draw_result(step['images'], step['watch_time'])
+            return True
+        if op == 'change':
+            return self.wait_for_change(step['timeout']) is not None
+        if op == 'sleep':
+            time.sleep(step['seconds'])
+            return True
+        if op == 'repeat':
+            first = resume[0] if resume else 0
+            for iteration in range(first, step['times']):
+                self.position.append(iteration)
+                try:
+                    self.run_scenario(step['steps'], resume[1:] if resume and iteration == first else 0)
+                finally:
+                    self.position.pop()
+            return True
+        raise ValueError(f"알 수 없는 시나리오 단계: {op}")
+
+    def watch_draw_result(self, images, watch_time):
+        """
+        뽑기 결과 화면을 watch_time 초 동안 확인하며 목표 캐릭터를 집계하는 함수
+        목표를 모두 얻었으면 ScenarioExit 를 발생시켜 남은 뽑기를 건너뜀
+        
+        Args:
+            images (list): 목표 캐릭터 이미지 이름 목록
+            watch_time (float): 결과 화면을 확인할 시간(초)
+            
+        Returns:
+            set: 이번 뽑기에서 발견한 이미지 이름
+        """
+        if not self.config['result_watch']:
+            time.sleep(watch_time)
+            return set()
+        
+        threshold = self.config['result_threshold']
+        seen = set()
+        start_time = time.time()
+        while True:
+            try:
+                results = self.match_templates(self.capture_screen(), images, threshold)
+                seen.update(name for name, (max_val, _) in results.items() if max_val >= threshold)
+            except Exception as e:
+                logger.error(f"뽑기 결과 확인 중 오류 발생: {str(e)}")
+            if len(seen) == len(images) or time.time() - start_time >= watch_time:
+                break
+            time.sleep(self.config['settle_poll'])
+        
+        self.tally.add(seen)
+        if seen:
+            logger.info(f"뽑기 결과에서 목표 캐릭터 발견: {', '.join(sorted(seen))}")
+        logger.info(f"뽑기 집계: {self.tally.summary()}")
+        if self.tally.goal_met:
+            raise ScenarioExit('goal')
+        
+        # 남은 대기 시간은 그대로 유지 (결과 연출이 끝나기 전에 앱을 종료하지 않도록)
+        remaining = watch_time - (time.time() - start_time)
+        if remaining > 0:
+            time.sleep(remaining)
+        return seen
 
-    def reset_account(self):
+    def detect_scenario_step(self, steps):
         """
-        계정 리을 위한 함수
+        현재 화면에 보이는 이미지로 시나리오 진행 위치를 찾는 함수
+        모든 진행 단계(진행/결과 확인/리셋) 시나리오를 통틀어 한 번만 등장하는 대기 이미지만 기준으로 사용하고,
+        resume_confirm 장의 연속된 화면에서 같은 이미지가 resume_threshold 이상으로 인식되어야 인정
+        (한 화면의 우연한 매칭으로 튜토리얼 등을 건너뛰지 않도록)
+        
+        Returns:
+            int: 시작할 단계 번호 (인식하지 못하면 0)
         """
-        # 향후 리셋 로직 구현
-        if not self.macro_sequence("lobby_button"):
-                logger.info("lobby_button 클릭 실패, 재시도")
-                time.sleep(2)
-                self.macro_sequence("lobby_button_other")
-        self.macro_sequence("guest_login_action_1", wait_time=5)
-        self.macro_sequence("guest_login_action_2", wait_time=5)
-        self.macro_sequence("guest_login_action_3", wait_time=5)
-        self.macro_sequence("guest_login_action_4", wait_time=5)
-        self.macro_sequence("guest_login_action_5", wait_time=5)
-        self.macro_sequence("guest_login_action_6", wait_time=5)
-        self.input_text_via_adb("Delete")
-        self.macro_sequence("guest_login_action_7", wait_time=5)
-        self.close_current_app()
+        counts = {}
+        for scenario in self.PHASES.values():
+            for step in scenario:
+                for name in scenario_templates([step]):
+                    counts[name] = counts.get(name, 0) + 1
+        anchors = {}
+        for index, step in enumerate(steps):
+            if step['op'] == 'seq':
+                anchors.setdefault(step['wait'], index)
+        anchors = {name: index for name, index in anchors.items() if counts.get(name) == 1}
         
+        threshold = self.config['resume_threshold']
+        name = None
+        try:
+            for attempt in range(max(1, self.config['resume_confirm'])):
+                if attempt > 0:
+                    time.sleep(self.config['settle_poll'])
+                results = self.match_templates(self.capture_screen(), list(anchors), threshold)
+                found = [(max_val, found_name) for found_name, (max_val, _) in results.items()
+                         if max_val >= threshold]
+                if not found or (name is not None and max(found)[1] != name):
+                    if name is not None:
+                        logger.debug(f"진행 위치 인식이 연속되지 않아 처음부터 진행합니다: {name}")
+                    return 0
+                name = max(found)[1]
+        except Exception as e:
+            logger.error(f"현재 화면 인식 중 오류 발생: {str(e)}")
+            return 0
+        
+        # 첫 단계(app_icon)는 재개가 아니므로 따로 알리지 않음
+        if anchors[name] > 0:
+            logger.info(f"현재 화면에서 진행 위치를 인식했습니다: {name} (단계 {anchors[name] + 1})")
+        return anchors[name]
 
     """==========[ 초기화 및 기본 기능 ]=========="""
-    def __init__(self, adb_port):
+    def __init__(self, adb_port, config=None, templates=None, match_pool=None, device=None):
         logger.debug(f"ADB 포트 {adb_port}로 연결 시도 ...")
           # 포트 번호 저장
-        self.device = AdbDeviceTcp('127.0.0.1', adb_port)
+        # device 를 지정하면 해당 객체 사용 (벤치마크의 재생 기기 등)
+        self.device = device if device is not None else AdbDeviceTcp('127.0.0.1', adb_port)
+        self.config = config if config is not None else dict(DEFAULT_CONFIG)
+        if templates is None:
+            templates = create_template_registry(self.config)
+        # 참조 이미지와 시나리오 좌표를 기기 해상도에 맞게 변환 (reference_size 가 없으면 그대로 사용)
+        self.scaler = ScreenScaler(self.config['reference_size'])
+        self.templates = ScaledTemplates(templates, self.scaler)
+        self.regions = SearchRegionTracker(self.config['roi_mode'], self.config['roi_margin'])
+        # 여러 작업자가 공유하는 매칭 스레드 풀 (없으면 현재 스레드에서 매칭)
+        self.match_pool = match_pool
+        # 마지막으로 캡처한 화면과 축소 흑백 이미지 (화면 변화 감지용)
+        self.last_frame = None
+        self.last_signature = None
+        self.frame_count = 0
+        # 보낸 입력(탭/텍스트) 횟수 (찾은 위치 재사용 가능 여부 판단용)
+        self.input_count = 0
+        # 다음 화면을 미리 캡처하는 스레드 (pipeline_capture)
+        self.capture_pool = None
+        if self.config['pipeline_capture']:
+            self.capture_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='Capture',
+                                                   initializer=bind_log_port, initargs=(adb_port,))
+        # 매 캡처마다 화면 크기 배열을 새로 할당하지 않도록 BGR 변환 버퍼를 돌려 씀
+        self.frame_buffers = FrameBuffers(2)
+        # 참조 이미지 이름 -> (매칭한 화면의 signature, 탐색 영역, 결과) (바뀌지 않은 화면의 재매칭 생략용)
+        self.match_cache = {}
+        # 시나리오에서 다음 단계가 기다릴 이미지 (적응형 대기의 조기 종료용)
+        self.next_images = []
+        self.archiver = None
+        # 현재 계정의 뽑기 결과 집계 (run_macro 에서 계정마다 새로 생성)
+        self.tally = DrawTally(TARGET_IMAGES, scenario_count(MACRO_SCENARIO, 'result'))
+        # 진행 중인 단계 이름과 시나리오 안의 위치 (진행 상태 저장용)
+        self.phase = None
+        self.position = []
+        # 사용자가 종료하여 진행 상태를 지운 뒤에는 다시 저장하지 않음
+        self.checkpoint_discarded = False
+        self.touch = None
+        self.sessions = None
+        self.app = AppTracker(self.shell, self.config['app_package'], self.config['app_activity'])
+        # 계정 결과와 함께 저장할 로그 파일 (감독 모드에서는 작업자별 로그로 바꿈)
+        self.log_path = 'ReseMara.log'
         try:
             self.device.connect()
             logger.debug("ADB 연결 성공!")
             self.port = adb_port
+            
+            # ADB 패킷은 헤더와 데이터를 나누어 보내므로 Nagle 지연을 끔 (작은 명령 응답 시간 단축)
+            transport = getattr(getattr(self.device, '_io_manager', None), '_transport', None)
+            connection = getattr(transport, '_connection', None)
+            if connection is not None:
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.config['shell_sessions']:
+                self.sessions = ShellSessionPool(self.device, self.config['shell_sessions'])
+            self.capture = create_capture_backend(self.device, self.config, self.sessions)
             # 필요한 폴더들 생성
             for folder in ['Row_Screen', 'Ref_Img', 'Accounts']:
                 if not os.path.exists(folder):
                     os.makedirs(folder)
                     logger.debug(f"{folder} 폴더 생성 완료")
             
+            if self.config['input_method'] == 'sendevent':
+                self.touch = SendeventTouch.discover(self)
+                if self.touch is None:
+                    logger.warning("터치 장치를 찾지 못해 input tap 을 사용합니다")
+            
+            # 여러 기기가 같은 폴더를 쓰므로 파일명에 포트 번호 포함
+            self.archiver = FrameArchiver('Row_Screen', f'screen_{adb_port}', self.config['archive_mode'],
+                                          self.config['archive_every'], self.config['archive_format'],
+                                          self.config['archive_max_files'])
+            # 화면 스트림/저장 스레드의 로그도 이 포트의 로그로 기록 (감독 모드의 작업자별 로그)
+            for thread in (getattr(self.capture, 'thread', None), self.archiver.thread):
+                if thread is not None:
+                    bind_log_port(adb_port, thread)
+            
+            if self.scaler.reference is not None:
+                self.detect_screen_size()
+            
         except Exception as e:
             logger.error(f"ADB 연결 실패: {str(e)}")
+            # 초기화 도중 만든 스레드/연결이 남지 않도록 정리 (감독 모드에서 재시작할 때마다 쌓이지 않도록)
+            self.close()
             raise
 
     def close(self):
         logger.debug("ADB 연결 종료 중...")
         try:
+            if self.capture_pool is not None:
+                self.capture_pool.shutdown(wait=False)
+            if self.archiver is not None:
+                self.archiver.close()
+            if hasattr(self, 'capture'):
+                self.capture.close()
+            if self.sessions is not None:
+                self.sessions.close()
             self.device.close()
             logger.debug("ADB 연결 종료 완료")
         except Exception as e:
             logger.error(f"ADB 연결 종료 중 오류 발생: {str(e)}")
 
     def capture_screen(self):
+        """
+        화면을 캡처하는 함수
+        
+        Returns:
+            Frame: 캡처한 화면 (bgr / gray 등은 처음 사용할 때 변환)
+        """
         try:
-            result = self.device.shell('screencap -p', decode=False)
-            image = Image.open(io.BytesIO(result))
-            
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            filename = f"Row_Screen/screen_{timestamp}.png"
-            
-            image.save(filename)
-            
-            # 크린샷 파일 개수 관리
-            self.manage_screenshots()
-            
-            return np.array(image)
+            return self._accept_frame(self._grab_frame())
             
         except Exception as e:
             logger.error(f"화면 캡처 실패: {str(e)}")
             raise
 
-    def manage_screenshots(self, max_files=30):
+    def _grab_frame(self):
+        """캡처 백엔드에서 화면을 가져오는 함수 (캡처 스레드에서도 호출)"""
+        start = time.perf_counter()
+        frame = self.capture.grab()
+        metrics.record('capture', 'screen', time.perf_counter() - start, port=self.port)
+        return frame
+
+    def _accept_frame(self, frame):
+        """
+        가져온 화면을 현재 화면으로 등록하는 함수 (번호/버퍼 지정, 저장, 변화 감지 기준 갱신)
+        미리 캡처했다가 버린 화면은 등록되지 않음
+        """
+        # 스트림 캡처에서 새 프레임이 없으면 같은 프레임이 반환되므로 다시 저장하지 않음
+        if frame is not self.last_frame:
+            self.frame_count += 1
+            frame.id = self.frame_count
+            self.frame_buffers.assign(frame)
+            self.archiver.add(frame)
+        self.last_frame = frame
+        self.last_signature = frame.signature
+        if self.frame_count == 1:
+            startup.mark('first_capture')
+            startup.report()
+        if self.scaler.update(frame.width, frame.height):
+            self._on_resize()
+        return frame
+
+    def detect_screen_size(self):
+        """
+        시작 시 한 번 캡처하여 참조 이미지/좌표 배율을 정하는 함수
+        (이후에는 캡처할 때마다 화면 크기/방향이 바뀌었는지 확인)
+        """
+        self.capture_screen()
+
+    def _on_resize(self):
+        """화면 크기가 바뀌었을 때 배율을 적용하고 이전 해상도 기준의 학습 결과를 버리는 함수"""
+        scaler = self.scaler
+        if scaler.reference is None:
+            return
+        logger.info(f"화면 크기 {scaler.size[0]}x{scaler.size[1]}, 참조 이미지 배율 {scaler.scale} "
+                    f"(좌표 배율 {scaler.scale_x:.3f}x{scaler.scale_y:.3f})")
+        self.regions = SearchRegionTracker(self.config['roi_mode'], self.config['roi_margin'])
+        self.match_cache.clear()
+        # 전체 로드 모드면 모든 참조 이미지의 변환을 미리 계산
+        if not self.config['template_cache_size']:
+            self.templates.registry.prepare_scale(scaler.scale, scaler.region_scale)
+
+    def poller(self):
+        """이미지 대기 루프용 FramePoller 를 생성하는 함수"""
+        return FramePoller(self, self.config['poll_interval'], self.capture_pool)
+
+    def shell(self, command, decode=True):
         """
-        Row_Screen 폴더의 이미지 파일 개수를 관하는 함수
-        max_files를 초과하는 경우 가장 오래된 파일부터 삭제
+        shell 명령을 실행하는 함수 (대화형 세션이 있으면 세션에서 실행)
         
-        Args:
-            max_files (int): 유지할 최대 파일 개수 (기본값: 30)
+        Returns:
+            str, bytes: 명령 출력
         """
+        start = time.perf_counter()
         try:
-            # Row_Screen 폴더의 모든 png 파일 목록 가져오기
-            files = [f for f in os.listdir('Row_Screen') if f.endswith('.png')]
-            
-            # 파일 개가 max_files 초과하는 경우
-            if len(files) > max_files:
-                # 파일을 생성 시간 순으로 정렬
-                files.sort(key=lambda x: os.path.getctime(os.path.join('Row_Screen', x)))
-                
-                # 초과하는 만큼 오래된 파일부터 삭제
-                for f in files[:len(files) - max_files]:
-                    file_path = os.path.join('Row_Screen', f)
-                    os.remove(file_path)
-                    
-        except Exception as e:
-            logger.error(f"스크린샷 관리 중 오류 발생: {str(e)}")
+            if self.sessions is not None:
+                return self.sessions.shell(command, decode)
+            return self.device.shell(command, decode=decode)
+        finally:
+            metrics.record('shell', command.split(None, 1)[0] if command.strip() else '', time.perf_counter() - start,
+                           port=self.port)
 
-    def click_position(self, x, y, wait_time=1):
+    def input_batch(self):
+        """현재 입력 방식(input / sendevent)에 맞는 InputBatch 를 생성하는 함수"""
+        return InputBatch(self.touch)
+
+    def run_input(self, batch):
         """
-        지정된 좌표를 클릭하고 지정된 시간만큼 대기하는 함수
+        모아둔 입력 명령을 한 번의 shell 호출로 실행하는 함수
+        
+        Args:
+            batch (InputBatch): 실행할 입력 명령
+        """
+        if batch.commands:
+            logger.debug(f"입력 명령 실행: {len(batch.commands)}개")
+            self.input_count += 1
+            self.shell(batch.script())
+
+    def tap(self, x, y):
+        """
+        좌표를 탭하는 함수 (sendevent 방식이어도 shell 호출은 한 번)
         
         Args:
             x (int): 클릭할 x 좌표
             y (int): 클릭할 y 좌표
+        """
+        self.run_input(self.input_batch().tap(x, y))
+
+    def click_position(self, x, y, wait_time=1):
+        """
+        지정된 좌표를 클릭하고 지정된 시간만큼 대기하는 함수
+        
+        Args:
+            x (int): 클릭할 x 좌표 (reference_size 기준, 기기 해상도에 맞게 변환)
+            y (int): 클릭할 y 좌표 (reference_size 기준, 기기 해상도에 맞게 변환)
             wait_time (float): 클릭 후 대기할 시간(초) (기본값: 1초)
             
         Returns:
             bool: 클릭 성공 여부
         """
-        time.sleep(wait_time)
+        self.settle(wait_time, expected=[])
         
         try:
+            x, y = self.scaler.to_device(x, y)
             logger.debug(f"좌표 클릭 시도: ({x}, {y})")
-            self.device.shell(f'input tap {x} {y}')
-            time.sleep(wait_time)  # 클릭 후 지정된 시간만큼 대기
+            self.tap(x, y)
+            self.settle(wait_time)  # 클릭 후 지정된 시간만큼 대기
             return True
         except Exception as e:
             logger.error(f"좌표 클릭 중 오류 발생: {str(e)}")
             wait_for_user_input()
             return False
 
-    def get_current_package(self):
+    def launch_app(self, icon_image='app_icon', wait_time=5):
         """
-        현재 포커스된 앱의 패키지 이름을  함수
+        게임을 실행하는 함수
+        패키지를 알고 있으면 am start / monkey 로 직접 실행하고, 모르거나 실패하면 아이콘을 찾아 클릭
         
         Returns:
-            str: 패키지  (찾지 못한 경우 None)
+            bool: 실행 성공 여부
         """
-        try:
-            # 현재 포커스된  정보 가져기
-            result = self.device.shell('dumpsys window | grep mCurrentFocus')
-            logger.debug(f"현재 창 정보: {result}")
-            
-            # 패키지 이름 추출 (일반적인 형식: mCurrentFocus=Window{...} PackageName/...)
-            if result:
-                import re
-                match = re.search(r'{\w+\s+\w+\s+(\S+)}', result)
-                if match:
-                    package_name = match.group(1).split('/')[0]
-                    logger.info(f"현재 실 중인 앱: {package_name}")
-                    return package_name
-            
-            logger.error("현재 실행 중인 앱을 찾을 수 없습니다")
-            return None
-            
-        except Exception as e:
-            logger.error(f"패키지 이름 확인 중 오류 발생: {str(e)}")
-            wait_for_user_input()
-            return None
+        if self.config['launch_method'] != 'icon' and self.app.package is not None:
+            try:
+                if self.app.launch():
+                    logger.info(f"앱을 직접 실행했습니다: {self.app.package}")
+                    self.settle(wait_time)
+                    return True
+                logger.warning("앱 직접 실행을 확인하지 못해 아이콘을 찾아 클릭합니다")
+                # 화면에서 잘못 확인한 패키지일 수 있으므로 다음 앱 종료 시 다시 확인
+                self.app.forget()
+            except Exception as e:
+                logger.error(f"앱 직접 실행 중 오류 발생: {str(e)}")
+        return self.macro_sequence(icon_image, wait_time=wait_time)
 
     """==========[ 매크로 보 기능 ]=========="""
-    def find_and_click(self, image_name, threshold=0.75, timeout=30):
-        try:
-            template_path = f'Ref_Img/{image_name}.png'
+    def match_template(self, frame, template, threshold=0.75):
+        """
+        화면에서 참조 이미지와 가장 잘 맞는 위치를 찾는 함수
+        (탐색 영역이 있으면 해당 영역만 탐색)
+        
+        Args:
+            frame (Frame): 캡처 화면 (BGR np.ndarray 도 가능)
+            template (Template): 참조 이미지
+            threshold (float): 탐색 영역 학습에 사용할 발견 임계값
+            
+        Returns:
+            tuple: (최고 매칭 점수, 화면 기준 좌상단 좌표)
+        """
+        start = time.perf_counter()
+        job = self._prepare_match(frame, template)
+        # 한 장만 매칭하면 병렬로 얻을 것이 없으므로 스레드 풀을 거치지 않고 현재 스레드에서 실행
+        # (여러 장을 동시에 매칭하는 match_templates 에서만 매칭 스레드 풀 사용)
+        if job[0] is None:
+            result = job[2]
+        else:
+            result = job[0][0](*job[0][1:])
+        return self._finish_match(template, job, result, threshold, start)
+
+    def _prepare_match(self, frame, template):
+        """
+        탐색 영역을 적용하여 매칭 함수 호출 인자를 만드는 함수
+        (프레임 변환은 호출한 스레드에서 한 번만 수행하여 여러 참조 이미지가 공유)
+        
+        Returns:
+            tuple: ((매칭 함수, 인자...), 탐색 영역 (없으면 None), 이전 결과, 화면 signature)
+                   화면이 바뀌지 않아 이전 결과를 쓰는 경우 매칭 함수 자리는 None
+        """
+        signature = None
+        if isinstance(frame, np.ndarray):
+            frame = Frame(frame, 'BGR')
+        elif self.config['skip_unchanged']:
+            signature = frame.signature
+        region = self.regions.region_for(template, frame.shape)
+        
+        cached = self.match_cache.get(template.name)
+        if (signature is not None and cached is not None and cached[1] == region
+                and not signature_changed(signature, cached[0], self.config['change_threshold'])):
+            return None, region, cached[2], signature
+        
+        screen_bgr = frame.bgr
+        if region is not None:
+            x0, y0, x1, y1 = region
+            screen_bgr = screen_bgr[y0:y1, x0:x1]
+        
+        if self.config['matcher'] == 'pyramid':
+            scale = self.config['pyramid_scale']
+            # 전체 화면 탐색이면 프레임에 저장된 축소 흑백 화면 재사용
+            small_screen = frame.scaled_gray(scale) if region is None else None
+            args = (match_pyramid, screen_bgr, template, scale, self.config['pyramid_candidates'], small_screen)
+        else:
+            args = (match_full, screen_bgr, template)
+        return args, region, None, signature
+
+    def _finish_match(self, template, job, result, threshold, start):
+        """
+        매칭 결과를 화면 기준 좌표로 바꾸고 탐색 영역 학습/성능 기록을 하는 함수
+        (이전 결과를 재사용한 경우에도 탐색 영역 학습은 진행하여 영역이 넓어지면 다시 매칭)
+        """
+        args, region, cached, signature = job
+        if args is None:
+            max_val, max_loc = cached
+        else:
+            x0, y0 = region[:2] if region is not None else (0, 0)
+            max_val, max_loc = result
+            max_loc = (max_loc[0] + x0, max_loc[1] + y0)
+            if signature is not None:
+                self.match_cache[template.name] = (signature, region, (max_val, max_loc))
+        
+        self.regions.record(template, max_loc, max_val >= threshold)
+        metrics.record('match', template.name, time.perf_counter() - start, port=self.port,
+                       score=round(float(max_val), 4), threshold=threshold, found=bool(max_val >= threshold),
+                       region=region is not None, skipped=args is None)
+        return max_val, max_loc
+
+    def reusable(self, match, image_name):
+        """
+        이전에 찾은 결과를 다시 캡처하지 않고 클릭에 사용할 수 있는지 확인하는 함수
+        (같은 이미지이고, 그 뒤로 새 화면을 캡처하거나 입력을 보내지 않았으며, 오래되지 않은 경우)
+        """
+        return (isinstance(match, MatchResult) and match.name == image_name
+                and self.last_frame is not None and match.frame_id == self.last_frame.id
+                and match.input_count == self.input_count
+                and time.time() - match.time <= self.config['match_reuse_age'])
+
+    def find_and_click(self, image_name, threshold=0.75, timeout=30, match=None):
+        """
+        이미지를 찾아 클릭하는 함수
+        
+        Args:
+            match (MatchResult): 직전에 같은 이미지를 찾은 결과 (재사용 가능하면 캡처 없이 바로 클릭)
             
-            template = cv2.imread(template_path)
+        Returns:
+            MatchResult: 클릭한 결과 (실패 시 False)
+        """
+        if self.reusable(match, image_name):
+            center_x, center_y = match.center
+            logger.debug(f"[{image_name}] 찾은 위치 재사용 (프레임 {match.frame_id}), 클릭 실행: ({center_x}, {center_y})")
+            self.tap(center_x, center_y)
+            return match
+        
+        # 다음 화면은 간격에 맞춰 미리 캡처 (대기가 끝나면 미리 받은 화면은 버림)
+        poller = self.poller()
+        try:
+            template = self.templates.get(image_name)
             if template is None:
-                logger.error(f"참조 이미지를 찾을 수 없음: {template_path}")
+                logger.error(f"참조 이미지를 찾을 수 없음: {self.templates.path(image_name)}")
                 wait_for_user_input()
                 return False
             
             start_time = time.time()
+            polls = 0
+            best = 0.0
             while True:
                 if time.time() - start_time > timeout:
                     logger.error(f"{timeout}초 동안 이미지를 찾지 못했습니다: {image_name}")
+                    self.archiver.mark_failure()
+                    self._record_wait(image_name, start_time, polls, best, threshold, False)
                     return False
                 
                 try:
-                    screen = self.capture_screen()
-                    screen_bgr = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR)
+                    frame = poller.next()
                     
-                    result = cv2.matchTemplate(screen_bgr, template, cv2.TM_CCOEFF_NORMED)
-                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+                    max_val, max_loc = self.match_template(frame, template, threshold)
+                    polls += 1
+                    best = max(best, max_val)
                     
                     logger.debug(f"[{image_name}] 이미지 매칭 점수: {max_val:.4f} (임계값: {threshold})")
                     
                     if max_val >= threshold:
-                        h, w = template.shape[:2]
-                        center_x = max_loc[0] + w//2
-                        center_y = max_loc[1] + h//2
+                        found = MatchResult(template, max_val, max_loc, frame, self.input_count)
+                        center_x, center_y = found.center
                         
                         logger.debug(f"[{image_name}] 이미지 발견 (매칭 점수: {max_val:.4f})")
                         logger.debug(f"[{image_name}] 클릭 실행: ({center_x}, {center_y})")
-                        self.device.shell(f'input tap {center_x} {center_y}')
-                        return True
+                        # 미리 요청한 캡처가 끝나거나 취소된 뒤에 탭 (캡처와 입력이 겹치거나 같은 셸 세션에서 탭이 밀리지 않도록)
+                        poller.close()
+                        self.tap(center_x, center_y)
+                        self._record_wait(image_name, start_time, polls, best, threshold, True)
+                        return found
                     else:
                         logger.debug(f"[{image_name}] 매칭된 이미지가 없습니다. 다시 시도합니다...")
-                        time.sleep(1)
                         
                 except Exception as e:
                     logger.error(f"화면 캡처 중 오류 발생: {str(e)}")
@@ -776,39 +3145,51 @@ class ReseMara:
             logger.error(f"이미지 매칭/클릭 중 오류 발생: {str(e)}")
             wait_for_user_input()
             return False
+        finally:
+            poller.close()
 
     def wait_for_image(self, image_name, threshold=0.75, timeout=20):
+        """
+        이미지가 나타날 때까지 대기하는 함수
+        
+        Returns:
+            MatchResult: 찾은 결과 (찾지 못하면 False)
+        """
+        # 다음 화면은 간격에 맞춰 미리 캡처 (대기가 끝나면 미리 받은 화면은 버림)
+        poller = self.poller()
         try:
-            template_path = f'Ref_Img/{image_name}.png'
-            
-            template = cv2.imread(template_path)
+            template = self.templates.get(image_name)
             if template is None:
-                logger.error(f"참조 이미지를 찾을 수 없음: {template_path}")
+                logger.error(f"참조 이미지를 찾을 수 없음: {self.templates.path(image_name)}")
                 wait_for_user_input()
                 return False
             
             start_time = time.time()
+            polls = 0
+            best = 0.0
             while True:
                 if time.time() - start_time > timeout:
                     logger.error(f"{timeout}초 동안 이미지를 찾지 못했습니다: {image_name}")
+                    self.archiver.mark_failure()
+                    self._record_wait(image_name, start_time, polls, best, threshold, False)
                     return False
                 
                 try:
-                    screen = self.capture_screen()
-                    screen_bgr = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR)
+                    frame = poller.next()
                     
-                    result = cv2.matchTemplate(screen_bgr, template, cv2.TM_CCOEFF_NORMED)
-                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+                    max_val, max_loc = self.match_template(frame, template, threshold)
+                    polls += 1
+                    best = max(best, max_val)
                     
                     logger.debug(f"[{image_name}] 이미지 매칭 점수: {max_val:.4f} (임계값: {threshold})")
                     
                     if max_val >= threshold:
                         logger.debug(f"[{image_name}] 이미지 발견 (매칭 점수: {max_val:.4f})")
                         logger.info(f"이미지 발견: {image_name}")
-                        return True
+                        self._record_wait(image_name, start_time, polls, best, threshold, True)
+                        return MatchResult(template, max_val, max_loc, frame, self.input_count)
                     else:
                         logger.debug(f"[{image_name}] 매칭된 미지가 없습니다. 다시 시도합니다...")
-                        time.sleep(1)
                         
                 except Exception as e:
                     logger.error(f"화면 캡처 중 오류 발생: {str(e)}")
@@ -819,6 +3200,95 @@ class ReseMara:
             logger.error(f"이미지 대기 중 오류 발생: {str(e)}")
             wait_for_user_input()
             return False
+        finally:
+            poller.close()
+
+    def _record_wait(self, name, start_time, polls, best, threshold, found):
+        """이미지 대기 결과(확인 횟수, 최고 점수, 시간 초과 여부)를 성능 추적에 기록하는 함수"""
+        metrics.record('wait', name, time.time() - start_time, port=self.port, polls=polls,
+                       score=round(float(best), 4), threshold=threshold, found=found, timed_out=not found)
+
+    def match_templates(self, frame, image_names, threshold=0.75):
+        """
+        한 장의 화면에 여러 참조 이미지를 매칭하는 함수
+        
+        Returns:
+            dict: 이미지 이름 -> (매칭 점수, 좌상단 좌표)
+        """
+        templates = [template for template in map(self.templates.get, image_names) if template is not None]
+        if self.match_pool is None or len(templates) < 2:
+            return {template.name: self.match_template(frame, template, threshold) for template in templates}
+        
+        # 매칭 스레드 풀에 모든 참조 이미지를 한 번에 넣어 동시에 매칭 (OpenCV 는 매칭 중 GIL 을 해제)
+        start = time.perf_counter()
+        jobs = [(template, self._prepare_match(frame, template)) for template in templates]
+        futures = [self.match_pool.submit(*job[0]) if job[0] is not None else None for _, job in jobs]
+        return {template.name: self._finish_match(template, job, future and future.result(), threshold, start)
+                for (template, job), future in zip(jobs, futures)}
+
+    def wait_for_any(self, image_names, threshold=0.75, timeout=20):
+        """
+        여러 이미지 중 하나가 나타날 때까지 대기하는 함수
+        매 확인마다 한 번만 캡처하여 모든 이미지를 같은 화면에서 비교
+        
+        Args:
+            image_names (list): 대기할 이미지 이름 목록
+            threshold (float): 이미지 매칭 임계값
+            timeout (float): 최대 대기 시간(초)
+            
+        Returns:
+            tuple: (발견한 MatchResult, 이름별 매칭 점수) - 찾지 못하면 None
+        """
+        scores = {}
+        poller = self.poller()
+        try:
+            missing = [name for name in image_names if self.templates.get(name) is None]
+            if missing:
+                logger.error(f"참조 이미지를 찾을 수 없음: {', '.join(missing)}")
+                wait_for_user_input()
+                return None, scores
+            
+            start_time = time.time()
+            polls = 0
+            best = 0.0
+            while True:
+                if time.time() - start_time > timeout:
+                    logger.error(f"{timeout}초 동안 이미지를 찾지 못했습니다: {', '.join(image_names)}")
+                    self.archiver.mark_failure()
+                    self._record_wait('/'.join(image_names), start_time, polls, best, threshold, False)
+                    return None, scores
+                
+                try:
+                    frame = poller.next()
+                    
+                    results = self.match_templates(frame, image_names, threshold)
+                    scores = {name: max_val for name, (max_val, _) in results.items()}
+                    polls += 1
+                    best = max([best, *scores.values()])
+                    logger.debug("이미지 매칭 점수: " + ", ".join(
+                        f"[{name}] {score:.4f}" for name, score in scores.items()) + f" (임계값: {threshold})")
+                    
+                    # 여러 개가 동시에 발견되면 점수가 가장 높은 이미지를 선택
+                    name, score = max(scores.items(), key=lambda item: item[1])
+                    if score >= threshold:
+                        logger.info(f"이미지 발견: {name}")
+                        self._record_wait('/'.join(image_names), start_time, polls, best, threshold, True)
+                        return MatchResult(self.templates.get(name), score, results[name][1], frame,
+                                           self.input_count), scores
+                    else:
+                        logger.debug("매칭된 이미지가 없습니다. 다시 시도합니다...")
+                        
+                except Exception as e:
+                    logger.error(f"화면 캡처 중 오류 발생: {str(e)}")
+                    wait_for_user_input()
+                    continue
+                
+        except Exception as e:
+            logger.error(f"이미지 대기 중 오류 발생: {str(e)}")
+            wait_for_user_input()
+            return None, scores
+        finally:
+            poller.close()
 
     def input_text_via_adb(self, text):
         """
@@ -829,7 +3299,7 @@ class ReseMara:
         """
         try:
             # 일반 텍스트 력
-            self.device.shell(f'input text {text}')  # 따옴표 제거
+            self.run_input(self.input_batch().text(text))  # 따옴표 제거
             logger.debug(f"텍스트 입력 완료: {text}")
             return True
         
@@ -840,18 +3310,24 @@ class ReseMara:
     def close_current_app(self):
         """
         현재 실행 중인 앱을 종료하는 함수
+        (게임 패키지는 처음 한 번만 확인하고 이후에는 저장된 이름 사용)
         
         Returns:
             bool:  종료 성공 여부
         """
         try:
             # 현재 실행 중인 앱의 패키지 이름 져오기
-            package_name = self.get_current_package()
+            package_name = self.app.resolve()
             
             if package_name:
+                # 저장한 패키지가 실행 중이 아니면 잘못 확인한 패키지일 수 있으므로 현재 창으로 다시 확인
+                if self.app.is_running() is False and not self.app.refresh():
+                    logger.info(f"앱이 이미 종료되어 있습니다: {package_name}")
+                    return True
+                package_name = self.app.package
                 logger.debug(f"앱 종료 시도: {package_name}")
                 # force-stop 명령어  강제 료
-                self.device.shell(f'am force-stop {package_name}')
+                self.app.stop()
                 logger.info(f"앱이 종료되었습니다: {package_name}")
                 return True
             else:
@@ -882,25 +3358,19 @@ class ReseMara:
             if image1_name and image2_name:
                 # 현재 시간을 파일명으 사용
                 timestamp = time.strftime("%Y%m%d_%H%M%S")
-                account_filename = f"Accounts/account_{timestamp}"
+                # 여러 작업자가 같은 초에 저장해도 겹치지 않도록 포트를 파일명에 포함
+                account_filename = f"Accounts/account_{self.port}_{timestamp}"
                 
                 # 스크린샷 저장
-                screen = self.capture_screen()
-                screen_bgr = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR)
-                cv2.imwrite(f"{account_filename}.png", screen_bgr)
+                frame = self.capture_screen()
+                cv2.imwrite(f"{account_filename}.png", frame.bgr)
                 
                 # 이미지 비교 로직
-                template1 = cv2.imread(f'Ref_Img/{image1_name}.png')
-                if template1 is not None:
-                    result1 = cv2.matchTemplate(screen_bgr, template1, cv2.TM_CCOEFF_NORMED)
-                    _, max_val1, _, _ = cv2.minMaxLoc(result1)
-                    result1 = max_val1 >= threshold
-                
-                template2 = cv2.imread(f'Ref_Img/{image2_name}.png')
-                if template2 is not None:
-                    result2 = cv2.matchTemplate(screen_bgr, template2, cv2.TM_CCOEFF_NORMED)
-                    _, max_val2, _, _ = cv2.minMaxLoc(result2)
-                    result2 = max_val2 >= threshold
+                results = self.match_templates(frame, [image1_name, image2_name], threshold)
+                if image1_name in results:
+                    result1 = results[image1_name][0] >= threshold
+                if image2_name in results:
+                    result2 = results[image2_name][0] >= threshold
                 
                 # 결과 로
                 logger.info(f"{image1_name}: {'발견' if result1 else '미발견'}")
@@ -908,7 +3378,7 @@ class ReseMara:
                 
                 #  파일 복사
                 import shutil
-                shutil.copy2('ReseMara.log', f"{account_filename}.log")
+                shutil.copy2(self.log_path, f"{account_filename}.log")
                 
                 # 자동 판단
                 if result1 and result2:  # 둘 중 하나라도 발견되면 종료
@@ -923,17 +3393,43 @@ class ReseMara:
     
 if __name__ == "__main__":
     logger.debug("프로그램 시작")
+    startup.enabled = True
+    startup.mark('import')
     # 종료 시 cleanup 함수 등록
     atexit.register(cleanup)
     
     # Ctrl+C핸들러 등록
     signal.signal(signal.SIGINT, signal_handler)
     
+    config = load_config()
+    if config['metrics']:
+        metrics.open(config['metrics_dir'])
+    startup.mark('config')
+    
+    # 참조 이미지는 시작 시 한 번만 로드하여 재사용
+    templates = create_template_registry(config)
+    if not config['template_cache_size']:
+        templates.preload()
+    startup.mark('templates')
+    
     # port.log 파일 경로 바탕화면으로 설정
     port_log_file = os.path.join(os.path.expanduser("~"), "Desktop", "port.log")
     
+    # 감독 모드: 모든 에뮬레이터를 한 프로세스에서 실행
+    supervisor = None
+    if '--all' in sys.argv[1:]:
+        interactive = False
+        for handler in logger.handlers:
+            handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s'))
+        logger.info("감독 모드로 모든 에뮬레이터에서 매크로를 시작합니다.")
+        supervisor = Supervisor(config, templates)
+        supervisor.run()
+        logger.info("모든 작업자가 종료되었습니다.")
+        sys.exit(0)
+    
     # 포트 입력 또는 자동 순환
     port_input = input("MuMu Player의 ADB 포트를 입력하세요 (자동 검색은 Enter): ").strip()
+    startup.mark('port_input', waiting=True)
 
     if port_input:
         # 수동 포트 입력의 경우
@@ -966,7 +3462,15 @@ if __name__ == "__main__":
             logger.error(f"포트 로그 파일 읽기 실패: {str(e)}")
             ports_to_try = mumu_ports
     
+    # 후보 포트를 하나씩 연결해 보면 닫힌 포트마다 시간 초과를 기다리므로 먼저 모두 동시에 확인
+    if len(ports_to_try) > 1:
+        ports_to_try = find_open_ports(ports_to_try)
+        logger.info(f"감지된 에뮬레이터 포트: {ports_to_try}")
+    startup.mark('port_scan')
+    
     macro = None
+    # 한 화면에서 여러 참조 이미지를 확인할 때 동시에 매칭
+    match_pool = create_match_pool(config)
     try:
         # port.log 파일 생성/추가
         try:
@@ -979,8 +3483,9 @@ if __name__ == "__main__":
         for port in ports_to_try:
             try:
                 logger.debug(f"포트 {port}로 연결 시도 중...")
-                macro = ReseMara(port)
+                macro = ReseMara(port, config, templates, match_pool)
                 logger.info(f"포트 {port}로 연결 성공!")
+                startup.mark('connect')
                 # 성공한 포트 번호를 파일에 추가
                 try:
                     with open(port_log_file, 'a') as f:
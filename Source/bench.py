@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import json
+import struct
+import argparse
+
+import cv2
+import numpy as np
+
+import ReseMara as resemara
+from ReseMara import (ReseMara, TemplateRegistry, create_template_registry, load_config, match_full,
+                      match_pyramid)
+from scenario import step_name
+
+def load_screens(folder):
+    """폴더의 스크린샷(png)을 BGR 배열로 읽는 함수"""
+    screens = []
+    for filename in sorted(os.listdir(folder)):
+        if not filename.endswith('.png'):
+            continue
+        path = os.path.join(folder, filename)
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            screens.append((filename, image))
+    return screens
+
+def compare_matchers(screen_folder, template_dir='Ref_Img', threshold=0.75, scale=0.5, candidates=3):
+    """
+    저장된 스크린샷 전체에 대해 기존 매처(match_full)와 피라미드 매처의
+    발견 여부/위치가 일치하는지 확인하고 소요 시간을 비교하는 함수
+
+    Returns:
+        int: 불일치 건수
+    """
+    screens = load_screens(screen_folder)
+    templates = TemplateRegistry(template_dir)
+    templates.preload()
+    names = sorted(templates.templates)
+    print(f"스크린샷 {len(screens)}장, 참조 이미지 {len(names)}개 비교")
+
+    full_time = 0.0
+    pyramid_time = 0.0
+    mismatches = 0
+    for filename, screen in screens:
+        for name in names:
+            template = templates.get(name)
+            if template.height > screen.shape[0] or template.width > screen.shape[1]:
+                continue
+
+            start = time.perf_counter()
+            full_val, full_loc = match_full(screen, template)
+            full_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            pyramid_val, pyramid_loc = match_pyramid(screen, template, scale, candidates)
+            pyramid_time += time.perf_counter() - start
+
+            full_found = full_val >= threshold
+            pyramid_found = pyramid_val >= threshold
+            same_loc = abs(full_loc[0] - pyramid_loc[0]) <= 2 and abs(full_loc[1] - pyramid_loc[1]) <= 2
+            if full_found != pyramid_found or (full_found and not same_loc):
+                mismatches += 1
+                print(f"[불일치] {filename} / {name}: "
+                      f"full={full_val:.4f}{full_loc} pyramid={pyramid_val:.4f}{pyramid_loc}")
+
+    print(f"기존 매처 합계: {full_time:.3f}초")
+    print(f"피라미드 매처 합계: {pyramid_time:.3f}초")
+    if pyramid_time > 0:
+        print(f"속도 향상: {full_time / pyramid_time:.2f}배")
+    print(f"불일치: {mismatches}건")
+    return mismatches
+
+class ReplayFinished(Exception):
+    """녹화된 화면을 모두 재생한 경우"""
+
+class ReplayDevice:
+    """
+    녹화된 스크린샷을 순서대로 돌려주는 가짜 ADB 기기
+    screencap 에는 현재 화면을 원시 프레임버퍼 형식으로 응답하고, 입력 명령은 기록만 함
+    
+    advance 가 'capture' 면 캡처할 때마다 (Row_Screen 처럼 모든 캡처를 저장한 녹화),
+    'tap' 이면 탭할 때마다 (Accounts 처럼 화면 전환 시점만 저장한 녹화) 다음 화면으로 넘어감
+    """
+    def __init__(self, screens, advance='capture', package='com.replay.game'):
+        self.frames = []
+        for filename, screen in screens:
+            rgba = cv2.cvtColor(screen, cv2.COLOR_BGR2RGBA)
+            height, width = rgba.shape[:2]
+            # Android 9 이상 형식 (width, height, format=RGBA_8888, colorspace)
+            self.frames.append((filename, struct.pack('<IIII', width, height, 1, 0) + rgba.tobytes()))
+        self.advance = advance
+        self.package = package
+        self.index = 0
+        self.captures = 0
+        self.taps = 0
+        self.commands = []
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def _next(self):
+        self.index += 1
+
+    def shell(self, command, decode=True):
+        self.commands.append(command)
+        if command.startswith('screencap'):
+            if self.index >= len(self.frames):
+                raise ReplayFinished(f"녹화 화면 {len(self.frames)}장 재생 완료")
+            data = self.frames[self.index][1]
+            self.captures += 1
+            if self.advance == 'capture':
+                self._next()
+            return data
+        
+        output = ''
+        if 'input tap' in command or 'sendevent' in command:
+            self.taps += 1
+            if self.advance == 'tap':
+                self._next()
+        elif command.startswith('dumpsys window'):
+            output = f"  mCurrentFocus=Window{{0 u0 {self.package}/.Main}}\n"
+        elif command.startswith('pidof'):
+            output = "1234\n"
+        return output if decode else output.encode()
+
+class VirtualClock:
+    """
+    ReseMara 모듈의 time 대신 사용하는 시계
+    sleep 은 실제로 기다리지 않고 누적만 하여, 재생 속도는 계산 시간에만 좌우되게 함
+    (타임아웃 판단에 쓰이는 time() 에는 누적된 대기 시간을 더함)
+    """
+    def __init__(self):
+        self.slept = 0.0
+
+    def sleep(self, seconds):
+        self.slept += max(0.0, seconds)
+
+    def time(self):
+        return time.time() + self.slept
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+class ReplayStats:
+    """재생 중 측정한 단계/캡처/매칭 시간"""
+    def __init__(self):
+        self.steps = {}
+        self.matches = {}
+        self.capture_count = 0
+        self.capture_time = 0.0
+
+    @staticmethod
+    def _add(table, name, elapsed, extra=0.0):
+        entry = table.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0, 'wait': 0.0})
+        entry['count'] += 1
+        entry['total'] += elapsed
+        entry['max'] = max(entry['max'], elapsed)
+        entry['wait'] += extra
+
+    def summary(self, compute_time, wait_time, frames, taps):
+        return {
+            'compute_time': compute_time,
+            'wait_time': wait_time,
+            'cycle_time': compute_time + wait_time,
+            'frames': frames,
+            'taps': taps,
+            'captures': self.capture_count,
+            'capture_time': self.capture_time,
+            'captures_per_second': self.capture_count / compute_time if compute_time > 0 else 0.0,
+            'steps': self.steps,
+            'matches': self.matches,
+        }
+
+class ReplayReseMara(ReseMara):
+    """실제 매크로 코드를 그대로 실행하면서 단계/캡처/매칭 시간을 측정하는 ReseMara"""
+    def __init__(self, device, config, templates, stats, clock):
+        self.stats = stats
+        self.clock = clock
+        super().__init__(0, config, templates, device=device)
+
+    def run_step(self, step, resume=()):
+        start = time.perf_counter()
+        slept = self.clock.slept
+        try:
+            return super().run_step(step, resume)
+        finally:
+            self.stats._add(self.stats.steps, step_name(step), time.perf_counter() - start,
+                            self.clock.slept - slept)
+
+    def _grab_frame(self):
+        start = time.perf_counter()
+        screen = super()._grab_frame()
+        self.stats.capture_count += 1
+        self.stats.capture_time += time.perf_counter() - start
+        return screen
+
+    def match_template(self, frame, template, threshold=0.75):
+        start = time.perf_counter()
+        result = super().match_template(frame, template, threshold)
+        self.stats._add(self.stats.matches, template.name, time.perf_counter() - start)
+        return result
+
+    def compare_images(self, image1_name=None, image2_name=None, threshold=0.7):
+        # 재생 중에는 Accounts 폴더에 기록하지 않고 판정만 수행
+        results = self.match_templates(self.capture_screen(), [image1_name, image2_name], threshold)
+        found = all(results.get(name, (0.0, None))[0] >= threshold for name in (image1_name, image2_name))
+        return 1 if found else 2
+
+def replay_macro(screen_folder, config_path='ReseMara.json', advance='capture', overrides=None):
+    """
+    녹화된 스크린샷으로 run_macro 를 실행하여 리세마라 한 사이클의 처리 시간을 측정하는 함수
+    실제 대기(sleep)는 건너뛰고 누적만 하므로 계산 시간과 대기 시간을 따로 보고
+    
+    Returns:
+        dict: 측정 결과 (ReplayStats.summary)
+    """
+    config = load_config(config_path)
+    config.update(overrides or {})
+    # 재생 기기는 원시 screencap 과 일반 shell 만 지원
+    # (미리 캡처한 화면을 버리면 재생 순서가 어긋나므로 캡처 파이프라인도 사용하지 않음)
+    config.update({'capture_backend': 'screencap', 'capture_mode': 'raw', 'shell_sessions': 0,
+                   'archive_mode': 'off', 'input_method': 'input', 'checkpoint': False,
+                   'pipeline_capture': False})
+    
+    templates = create_template_registry(config)
+    if not config['template_cache_size']:
+        templates.preload()
+    screens = load_screens(screen_folder)
+    if not screens:
+        raise FileNotFoundError(f"재생할 스크린샷이 없습니다: {screen_folder}")
+    
+    device = ReplayDevice(screens, advance)
+    stats = ReplayStats()
+    clock = VirtualClock()
+    
+    # 오류 시 입력을 기다리지 않고 예외로 종료
+    resemara.interactive = False
+    resemara.time = clock
+    start = time.perf_counter()
+    try:
+        macro = ReplayReseMara(device, config, templates, stats, clock)
+        try:
+            macro.run_macro()
+        except RuntimeError:
+            # 녹화가 끝나면 캡처 실패가 사용자 입력 대기(예외)로 이어짐
+            if device.index < len(device.frames):
+                raise
+    finally:
+        resemara.time = time
+    compute_time = time.perf_counter() - start
+    return stats.summary(compute_time, clock.slept, len(device.frames), device.taps)
+
+def print_replay_report(result):
+    print(f"재생 화면 {result['frames']}장, 캡처 {result['captures']}회, 탭 {result['taps']}회")
+    print(f"계산 시간: {result['compute_time']:.3f}초 / 대기 시간: {result['wait_time']:.3f}초 "
+          f"/ 사이클 시간: {result['cycle_time']:.3f}초")
+    if result['captures']:
+        print(f"캡처: {result['captures_per_second']:.1f}회/초, "
+              f"평균 {result['capture_time'] / result['captures'] * 1000:.2f}ms")
+    
+    print("\n[단계별 시간] 이름 / 횟수 / 평균(ms) / 최대(ms) / 대기(초)")
+    for name, entry in result['steps'].items():
+        print(f"  {name:<32} {entry['count']:>4} {entry['total'] / entry['count'] * 1000:>10.2f} "
+              f"{entry['max'] * 1000:>10.2f} {entry['wait']:>8.1f}")
+    
+    print("\n[참조 이미지별 매칭 시간] 이름 / 횟수 / 평균(ms) / 합계(ms)")
+    for name, entry in sorted(result['matches'].items(), key=lambda item: -item[1]['total']):
+        print(f"  {name:<32} {entry['count']:>4} {entry['total'] / entry['count'] * 1000:>10.2f} "
+              f"{entry['total'] * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='ReseMara 벤치마크')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    matcher_parser = subparsers.add_parser('matcher', help='기존 매처와 피라미드 매처 비교')
+    matcher_parser.add_argument('screens', help='스크린샷 폴더 (예: Row_Screen, Accounts)')
+    matcher_parser.add_argument('--templates', default='Ref_Img')
+    matcher_parser.add_argument('--threshold', type=float, default=0.75)
+    matcher_parser.add_argument('--scale', type=float, default=0.5)
+    matcher_parser.add_argument('--candidates', type=int, default=3)
+
+    replay_parser = subparsers.add_parser('replay', help='녹화된 스크린샷으로 run_macro 처리 시간 측정')
+    replay_parser.add_argument('screens', help='스크린샷 폴더 (예: Row_Screen, Accounts)')
+    replay_parser.add_argument('--config', default='ReseMara.json')
+    replay_parser.add_argument('--advance', choices=['capture', 'tap'], default='capture',
+                               help='다음 화면으로 넘어가는 시점 (capture: 캡처마다, tap: 탭마다)')
+    replay_parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                               help='설정값 덮어쓰기 (값은 JSON, 예: matcher="pyramid")')
+    replay_parser.add_argument('--json', help='측정 결과를 저장할 JSON 파일')
+    replay_parser.add_argument('--budget', type=float,
+                               help='계산 시간이 이 값(초)을 넘으면 종료 코드 1 (CI 회귀 확인용)')
+
+    args = parser.parse_args()
+    if args.command == 'matcher':
+        mismatches = compare_matchers(args.screens, args.templates, args.threshold, args.scale, args.candidates)
+        sys.exit(1 if mismatches else 0)
+    elif args.command == 'replay':
+        overrides = {}
+        for item in args.set:
+            key, _, value = item.partition('=')
+            try:
+                overrides[key] = json.loads(value)
+            except ValueError:
+                overrides[key] = value
+        result = replay_macro(args.screens, args.config, args.advance, overrides)
+        print_replay_report(result)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+        sys.exit(1 if args.budget is not None and result['compute_time'] > args.budget else 0)
@@ -1,10 +1,10 @@
 import os
+import sys
 import subprocess
 
 def create_requirements():
     requirements = [
         'adb-shell',
-        'pillow',  # PIL용
         'opencv-python',  # cv2용
         'numpy',  # np용
         'pyinstaller',  # 빌드용
@@ -15,7 +15,15 @@ def create_requirements():
         for req in requirements:
             f.write(f"{req}\n")
 
-def build_exe():
+def build_template_pack(dist):
+    # Ref_Img 의 PNG 들을 미리 디코딩하여 메모리 매핑할 수 있는 한 파일로 만듦 (exe 옆에 Ref_Img 대신 배포)
+    from ReseMara import TemplatePack
+    
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Ref_Img')
+    os.makedirs(dist, exist_ok=True)
+    return TemplatePack.build(source, os.path.join(dist, 'Ref_Img.pack'))
+
+def build_exe(onefile=False):
     print("requirements.txt 생성 중...")
     create_requirements()
     
@@ -25,13 +33,24 @@ def build_exe():
     print("exe 파일 생성 중...")
     subprocess.run([
         'pyinstaller',
-        '--onefile',  # 단일 exe 파일로 생성
+        # onedir: 실행할 때마다 임시 폴더에 라이브러리 전체를 풀어야 하는 onefile 과 달리 바로 시작
+        '--onefile' if onefile else '--onedir',
+        '--noconfirm',  # 이전 빌드 폴더 덮어쓰기
+        '--noupx',  # 압축된 DLL 을 실행 시 풀지 않도록 UPX 사용 안 함
+        '--exclude-module', 'PIL',  # 사용하지 않는 모듈 제외
+        '--exclude-module', 'tkinter',
         '--name', 'ReseMara',  # 출력 파일 이름
         'ReseMara.py'
     ])
+    dist = 'dist' if onefile else os.path.join('dist', 'ReseMara')
+    
+    print("템플릿 팩 생성 중...")
+    version = build_template_pack(dist)
     
     print("빌드 완료!")
-    print("생성된 exe 파일 위치: dist/ReseMara.exe")
+    print(f"생성된 exe 파일 위치: {os.path.join(dist, 'ReseMara.exe')}")
+    print(f"템플릿 팩 위치: {os.path.join(dist, 'Ref_Img.pack')} (버전 {version})")
 
 if __name__ == "__main__":
-    build_exe() 
\ No newline at end of file
+    # 기본은 시작이 빠른 폴더 배포, --onefile 이면 기존처럼 단일 exe
+    build_exe('--onefile' in sys.argv[1:]) 
\ No newline at end of file
@@ -0,0 +1,392 @@
+"""
+리세마라 진행 순서를 데이터로 정의한 시나리오
+ReseMara.run_scenario 가 위에서부터 순서대로 실행
+"""
+
+def seq_step(wait, click=None, wait_time=5, retry=0, retry_delay=2, on_fail=None):
+    """wait 이미지를 기다린 뒤 click 이미지(None이면 wait와 동일)를 클릭 (macro_sequence)"""
+    return {'op': 'seq', 'wait': wait, 'click': click, 'wait_time': wait_time,
+            'retry': retry, 'retry_delay': retry_delay, 'on_fail': on_fail or []}
+
+def touch_step(wait=None, click=None, wait_time=5, x=300, y=300, retry=0, retry_delay=2, on_fail=None):
+    """좌표를 터치한 뒤 이미지를 찾아 클릭 (macro_touch_sequence)"""
+    return {'op': 'touch', 'wait': wait, 'click': click, 'wait_time': wait_time, 'x': x, 'y': y,
+            'retry': retry, 'retry_delay': retry_delay, 'on_fail': on_fail or []}
+
+def any_step(*images, wait_time=5, until=None, max_loops=1, retry=0, retry_delay=2, on_fail=None):
+    """
+    여러 이미지 중 먼저 나타난 이미지를 클릭 (macro_sequence_any)
+    until 이 지정되면 해당 이미지를 클릭할 때까지 최대 max_loops 번 반복 (찾지 못한 대기도 한 번으로 셈)
+    """
+    if max_loops < 1:
+        raise ValueError(f"max_loops 는 1 이상이어야 합니다: {max_loops}")
+    return {'op': 'any', 'images': list(images), 'wait_time': wait_time,
+            'until': until, 'max_loops': max_loops,
+            'retry': retry, 'retry_delay': retry_delay, 'on_fail': on_fail or []}
+
+def batch_step(*clicks, interval=1.0, wait_time=5, retry=0, retry_delay=2, on_fail=None):
+    """
+    한 화면의 여러 버튼을 (이미지 이름, 클릭 횟수) 순서대로 클릭 (macro_batch_sequence)
+    모든 탭과 사이 대기(interval)를 한 번의 shell 호출로 실행
+    """
+    return {'op': 'batch', 'clicks': [tuple(click) for click in clicks], 'interval': interval,
+            'wait_time': wait_time, 'retry': retry, 'retry_delay': retry_delay, 'on_fail': on_fail or []}
+
+def tap_step(x, y, wait_time=1):
+    """좌표 클릭 (click_position)"""
+    return {'op': 'tap', 'x': x, 'y': y, 'wait_time': wait_time}
+
+def launch_step(icon="app_icon", wait_time=5):
+    """
+    게임 실행 (launch_app)
+    패키지를 알고 있으면 직접 실행하고, 모르면 icon 이미지를 찾아 클릭
+    """
+    return {'op': 'launch', 'icon': icon, 'wait_time': wait_time}
+
+def close_app_step(wait_time=0):
+    """현재 앱 종료 후 대기 (close_current_app)"""
+    return {'op': 'close_app', 'wait_time': wait_time}
+
+def text_step(text):
+    """텍스트 입력 (input_text_via_adb)"""
+    return {'op': 'text', 'text': text}
+
+def change_step(timeout=10):
+    """화면이 바뀔 때까지 대기 (wait_for_change)"""
+    return {'op': 'change', 'timeout': timeout}
+
+def sleep_step(seconds):
+    """단순 대기"""
+    return {'op': 'sleep', 'seconds': seconds}
+
+def repeat_step(times, steps):
+    """steps 를 times 번 반복"""
+    return {'op': 'repeat', 'times': times, 'steps': steps}
+
+def result_step(images, watch_time=5):
+    """
+    뽑기 결과 화면을 watch_time 초 동안 지켜보며 images(목표 캐릭터)가 나왔는지 집계
+    (ReseMara.watch_draw_result, 목표를 모두 얻으면 남은 뽑기를 건너뜀)
+    """
+    return {'op': 'result', 'images': list(images), 'watch_time': watch_time}
+
+def step_name(step):
+    """로그에 사용할 단계 이름"""
+    if step['op'] in ('seq', 'touch'):
+        return step['click'] or step['wait'] or f"({step['x']}, {step['y']})"
+    if step['op'] == 'any':
+        return '/'.join(step['images'])
+    if step['op'] == 'batch':
+        return '+'.join(name for name, _ in step['clicks'])
+    return step['op']
+
+def scenario_templates(steps):
+    """시나리오에서 사용하는 모든 참조 이미지 이름 목록"""
+    names = []
+    for step in steps:
+        if step['op'] in ('seq', 'touch'):
+            names += [name for name in (step['wait'], step['click']) if name]
+            names += scenario_templates(step['on_fail'])
+        elif step['op'] == 'any':
+            names += step['images']
+        elif step['op'] == 'batch':
+            names += [name for name, _ in step['clicks']]
+            names += scenario_templates(step['on_fail'])
+        elif step['op'] == 'launch':
+            names.append(step['icon'])
+        elif step['op'] == 'result':
+            names += step['images']
+        elif step['op'] == 'repeat':
+            names += scenario_templates(step['steps'])
+    return list(dict.fromkeys(names))
+
+def scenario_count(steps, op):
+    """시나리오에서 op 단계가 실행되는 횟수 (repeat 반복 횟수 포함)"""
+    count = 0
+    for step in steps:
+        if step['op'] == op:
+            count += 1
+        elif step['op'] == 'repeat':
+            count += step['times'] * scenario_count(step['steps'], op)
+    return count
+
+# 레벨업은 나타나지 않을 수도 있으므로 미션 완료가 나올 때까지 두 화면을 함께 처리
+# (기존처럼 미션 완료를 찾지 못하면 찾을 때까지 다시 기다림)
+STAGE_RESULT = any_step("level_up", "mission_complete", until="mission_complete", max_loops=3, retry=1)
+
+# 앱 재시작 후 타이틀 화면 진입
+APP_START = [
+    launch_step("app_icon"),
+    seq_step("title_start", retry=1),
+]
+
+# 목표 캐릭터 (뽑기 결과 화면과 보유 인형 목록에서 확인)
+TARGET_IMAGES = ["suomi", "kyeongu"]
+
+# 앱 재시작 후 보유 인형 목록을 열어 최종 결과 확인
+# (뽑기 도중 목표를 모두 얻으면 남은 뽑기 없이 바로 이 단계로 이동)
+RESULT_CHECK = [
+    close_app_step(wait_time=5),
+    *APP_START,
+    seq_step("maintenance_button"),
+    seq_step("maintenance_list_expand"),
+]
+
+MACRO_SCENARIO = [
+    *APP_START,
+    seq_step("guest_login"),
+    #seq_step("guest_login_confirm"),
+
+    # 컷신 스킵 시도 (실패시 재시도)
+    touch_step(wait="first_cutscean", click="cutscene_skip", on_fail=[touch_step(wait="cutscene_skip")]),
+
+    # 튜토리얼 대사 시퀀스 1-4
+    *[seq_step(f"tuto_dialog_{i}") for i in range(1, 5)],
+
+    seq_step("tuto_action_1"),
+    seq_step("tuto_dialog_5", "tuto_action_2"),
+    seq_step("tuto_dialog_6", "tuto_action_3"),
+    seq_step("tuto_dialog_7", "battle_confirm_button"),
+
+    # 튜토리얼 대사 8-9
+    seq_step("tuto_dialog_8"),
+    seq_step("tuto_dialog_9"),
+
+    touch_step(wait="cutscene_skip"),
+
+    # 튜토리얼 대사 10-16
+    *[seq_step(f"tuto_dialog_{i}") for i in range(10, 17)],
+
+    # 튜토리얼 행동 5-8
+    seq_step("tuto_dialog_17", "tuto_action_5"),
+    seq_step("tuto_action_6"),
+    seq_step("tuto_action_7"),
+    seq_step("tuto_action_8"),
+
+    seq_step("battle_confirm_button"),
+
+    # 튜토리얼 대사 18-27
+    *[seq_step(f"tuto_dialog_{i}") for i in range(18, 28)],
+
+    touch_step(wait="cutscene_skip"),
+    touch_step(wait="cutscene_skip"),
+
+    # 여 지휘관을 원하면 아래의 단계로 실행
+    #touch_step(wait="nickname_creation_confirm"),
+    # 남 지휘관
+    seq_step("nickname_input_confirm"),
+    seq_step("nickname_creation_confirm"),
+
+    seq_step("skip_after_creation"),
+    seq_step("story_skip_confirm"),
+
+    # 1-1 대사 시퀀스
+    *[seq_step(f"1-1_dialog_{i}") for i in range(1, 8)],
+    seq_step("1-1_dialog_8", "1-1_action_1"),
+    seq_step("1-1_dialog_9", "1-1_action_2"),
+    seq_step("1-1_dialog_10", "battle_confirm_button"),
+
+    seq_step("1-1_dialog_11"),
+    seq_step("1-1_action_3"),
+    seq_step("battle_confirm_button"),
+
+    seq_step("1-1_dialog_12"),
+    seq_step("dialog_skip_button"),
+    *[seq_step(f"1-1_dialog_{i}") for i in range(13, 20)],
+    seq_step("1-1_dialog_20", "1-1_action_4"),
+    seq_step("1-1_dialog_21", "1-1_action_5"),
+    seq_step("1-1_dialog_22", "battle_confirm_button"),
+    seq_step("1-1_dialog_23"),
+    seq_step("1-1_dialog_24"),
+    seq_step("1-1_dialog_25", "1-1_action_6"),
+    seq_step("1-1_dialog_26"),
+    seq_step("1-1_dialog_27", "1-1_action_13"),
+    seq_step("battle_confirm_button"),
+    seq_step("1-1_action_7"),
+    seq_step("battle_confirm_button"),
+    seq_step("1-1_action_8"),
+    seq_step("battle_confirm_button"),
+    seq_step("1-1_dialog_28"),
+    seq_step("dialog_skip_button"),
+    seq_step("dialog_skip_button"),
+
+    seq_step("1-1_dialog_29"),
+    seq_step("1-1_dialog_30"),
+    seq_step("1-1_dialog_31"),
+
+    seq_step("1-1_action_11"),
+    seq_step("1-1_action_11"),
+    seq_step("1-1_dialog_32"),
+    seq_step("1-1_dialog_33"),
+
+    seq_step("1-1_action_11"),
+    seq_step("1-1_action_11"),
+
+    seq_step("1-1_dialog_34", retry=1),
+
+    seq_step("1-1_action_12"),
+
+    seq_step("1-1_dialog_35"),
+    seq_step("1-1_dialog_36"),
+
+    STAGE_RESULT,
+
+    seq_step("stage_clear_confirm"),
+    touch_step(wait="cutscene_skip"),
+    touch_step(wait="cutscene_skip"),
+    seq_step("dialog_skip_button"),
+    touch_step(wait="cutscene_skip"),
+
+    seq_step("lobby_event_screen"),
+    seq_step("lobby_preparation"),
+    seq_step("1st_stage_entry_confirm"),
+
+    # 1-2
+    seq_step("1-2_stage_select"),
+    seq_step("stage_entry"),
+    seq_step("dialog_skip_button"),
+    *[seq_step(f"1-2_dialog_{i}") for i in range(1, 10)],
+    seq_step("1-2_dialog_10", "1-2_action_1"),
+    seq_step("1-2_dialog_11", "1-2_action_2"),
+    seq_step("1-2_dialog_12", "1-2_action_3"),
+    seq_step("1-2_dialog_13", "1-2_action_2"),
+    seq_step("1-2_dialog_14", "1-2_action_4"),
+    seq_step("1-2_dialog_15", "auto_stage", wait_time=20),
+    seq_step("1-2_dialog_16", wait_time=10),
+
+    STAGE_RESULT,
+
+    seq_step("stage_clear_confirm_small"),
+    seq_step("dialog_skip_button"),
+
+    # 1-3
+    seq_step("1-3_stage_select"),
+    seq_step("stage_entry"), # 여기서부터 재검해야함
+    *[seq_step(f"1-3_dialog_{i}") for i in range(1, 8)],
+    #touch_step(wait="cutscene_skip"),
+
+    #seq_step("skip_notification_popup"),
+    #seq_step("skip_popup_check_done", "skip_done_confirm"),
+    seq_step("1-3_action_1", wait_time=7),
+    tap_step(100, 450, wait_time=8),
+    seq_step("auto_stage", wait_time=15),
+    seq_step("1-3_dialog_8"),
+
+    seq_step("1-3_action_3", retry=1),
+
+    seq_step("1-3_dialog_9"),
+
+    STAGE_RESULT,
+    seq_step("stage_clear_confirm"),
+
+    seq_step("sl-1-1_stage_select"),
+    seq_step("story_stage_view"),
+    seq_step("dialog_skip_button"),
+    seq_step("empty_area_touch"),
+
+    # 1-4
+    seq_step("1-4_stage_select"),
+    seq_step("stage_entry"),
+    seq_step("dialog_skip_button"),
+    seq_step("1-4_dialog_1"),
+    seq_step("1-4_dialog_2"),
+    seq_step("1-3_action_1"),
+    seq_step("auto_stage", wait_time=25),
+
+    STAGE_RESULT,
+
+    seq_step("stage_clear_confirm"),
+
+    seq_step("sl-1-2_stage_select"),
+    seq_step("story_stage_view"),
+    seq_step("dialog_skip_button"),
+    seq_step("empty_area_touch"),
+
+    # 첫 모집
+    seq_step("recruit_dialog_1", "lobby_button", wait_time=10),
+    seq_step("empty_area_touch"),
+    seq_step("recruit_dialog_2", "recruit_button",
+             on_fail=[seq_step("empty_area_touch"), seq_step("recruit_dialog_2", "recruit_button")]),
+    seq_step("recruit_dialog_3", "recruit_action_3"),
+    seq_step("recruit_dialog_4", "recruit_action_4"),
+    touch_step(wait="gacha_preview_skip", wait_time=20, retry_delay=5,
+               on_fail=[tap_step(100, 400, wait_time=20)]),
+    touch_step(wait="gacha_result_close", retry_delay=5,
+               on_fail=[tap_step(100, 400, wait_time=5), touch_step(wait="gacha_result_close")]),
+    seq_step("recruit_dialog_5", "lobby_button", on_fail=[seq_step("lobby_button_other")]),
+
+    seq_step("recruit_dialog_6", "maintenance_button"),
+    touch_step(wait="cutscene_skip"),
+    seq_step("maintenance_tutorial_skip"),
+    any_step("lobby_button", "lobby_button_other"),
+
+    # 1-5 (현재 사용하지 않음)
+    # seq_step("lobby_preparation"),
+    # seq_step("1st_stage_entry_confirm"),
+    # seq_step("1-5_stage_select"),
+    # seq_step("stage_entry"),
+    # seq_step("1-5_dialog_1"),
+    # seq_step("1-5_dialog_2"),
+    # seq_step("1-3_action_1"),
+    # seq_step("1-5_dialog_3"),
+    # seq_step("1-5_dialog_4"),
+    # seq_step("1-5_dialog_5"),
+    # seq_step("1-3_action_3"),
+    # seq_step("auto_stage", wait_time=20),
+    # STAGE_RESULT,
+    # seq_step("1-5_dialog_6", "stage_clear_confirm"),
+    # seq_step("dialog_skip_button"),
+    # seq_step("weapon_tutorial_skip"),
+    # any_step("lobby_button", "lobby_button_other"),
+    # seq_step("empty_area_touch"),
+    # seq_step("1-3_action_3"),
+    # seq_step("beppo_reward_popup"),
+    # seq_step("beppo_reward_popup_receive"),
+    # seq_step("empty_area_touch"),
+    # seq_step("back_button"),
+
+    # 우편 수령
+    seq_step("mail_button"),
+    seq_step("mail_all_receive", wait_time=15),
+    tap_step(100, 450, wait_time=5),
+    touch_step(wait="empty_area_touch",
+               on_fail=[tap_step(100, 450, wait_time=5), seq_step("empty_area_touch")]),
+    any_step("back_button", "back_button_other"),
+
+    # 초보자뽑기 10연차 x 5 (뽑기 후 앱을 재시작해야 다음 뽑기 가능)
+    repeat_step(5, [
+        seq_step("recruit_button"),
+        seq_step("beginner_draw_10_times", wait_time=0),
+        result_step(TARGET_IMAGES, watch_time=5),
+        close_app_step(wait_time=10),
+        *APP_START,
+    ]),
+
+    # 픽업 아이템 구매 후 픽업 10연차
+    seq_step("recruit_button"),
+    seq_step("gacha_shop"),
+    seq_step("pickup_item_purchase"),
+    # 구매 버튼 5번과 확인을 한 번에 입력 (화면 갱신을 기다리도록 탭 사이 1초 대기)
+    # 확인 버튼이 같은 화면에 없으면 기존처럼 한 번씩 다시 찾아서 클릭
+    batch_step(("purchase_item_available", 5), ("gacha_item_confirm", 1), interval=1.0,
+               on_fail=[*[seq_step("purchase_item_available") for _ in range(5)],
+                        seq_step("gacha_item_confirm")]),
+    seq_step("empty_area_touch"),
+    any_step("back_button", "back_button_other"),
+    seq_step("number_of_items"),
+    seq_step("pickup_10_times", wait_time=0),
+    result_step(TARGET_IMAGES, watch_time=3),
+    #seq_step("gacha_item_confirm"),
+
+    # 결과 확인을 위해 보유 인형 목록 열기
+    *RESULT_CHECK,
+]
+
+# 계정 삭제 후 게스트 계정으로 다시 시작
+RESET_SCENARIO = [
+    any_step("lobby_button", "lobby_button_other"),
+    *[seq_step(f"guest_login_action_{i}") for i in range(1, 7)],
+    text_step("Delete"),
+    seq_step("guest_login_action_7"),
+    close_app_step(),
+]
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Source'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# ReseMara 는 import 시 현재 폴더에 ReseMara.log 를 만들므로 임시 폴더에서 실행
+os.chdir(tempfile.mkdtemp(prefix='resemara_test_'))
@@ -0,0 +1,117 @@
+"""
+테스트용 가짜 adbd
+127.0.0.1 의 임의 포트에서 ADB 프로토콜(CNXN/OPEN/OKAY/WRTE/CLSE)을 흉내 내어
+AdbDeviceTcp 와 ShellSession 을 실제 소켓 위에서 시험할 수 있게 함
+"""
+import re
+import socket
+import struct
+import threading
+
+from adb_shell import constants
+from adb_shell.adb_message import AdbMessage
+
+MARKER_LINE = re.compile(rb"^printf '\\n%s %d\\n' (\S+) \"\$\?\"$")
+
+class FakeAdbd:
+    """
+    shell:sh 스트림만 지원하는 가짜 기기
+    
+    Args:
+        commands (dict): 명령 -> (출력 bytes, 종료 코드)
+        chunk_size (int): 출력 WRTE 패킷 하나의 최대 크기 (작게 하면 표식이 패킷 사이에서 나뉨)
+        close_after (int): 스트림 하나에서 이 개수만큼 명령을 처리한 뒤 기기 쪽에서 CLSE (None이면 유지)
+    """
+    def __init__(self, commands=None, chunk_size=4096, close_after=None):
+        self.commands = commands or {}
+        self.chunk_size = chunk_size
+        self.close_after = close_after
+        self.streams = {}       # 기기 쪽 id -> [호스트 쪽 id, 입력 버퍼, 처리한 명령 수]
+        self.next_id = 100
+        self.opened = 0
+        self.received = []      # 실행한 명령 (표식 줄 제외)
+        self.server = socket.create_server(('127.0.0.1', 0))
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.close()
+
+    def _serve(self):
+        try:
+            conn, _ = self.server.accept()
+        except OSError:
+            return
+        with conn:
+            try:
+                while True:
+                    header = self._recv(conn, 24)
+                    command, arg0, arg1, length, _, _ = struct.unpack(constants.MESSAGE_FORMAT, header)
+                    data = self._recv(conn, length) if length else b''
+                    self._handle(conn, struct.pack('<I', command), arg0, arg1, data)
+            except (ConnectionError, OSError):
+                pass
+
+    @staticmethod
+    def _recv(conn, size):
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('closed')
+            data += chunk
+        return data
+
+    @staticmethod
+    def _send(conn, command, arg0, arg1, data=b''):
+        message = AdbMessage(command, arg0, arg1, data)
+        conn.sendall(message.pack() + data)
+
+    def _handle(self, conn, command, arg0, arg1, data):
+        if command == constants.CNXN:
+            self._send(conn, constants.CNXN, constants.VERSION, constants.MAX_ADB_DATA, b'device::\0')
+        elif command == constants.OPEN:
+            self.next_id += 1
+            self.opened += 1
+            self.streams[self.next_id] = [arg0, bytearray(), 0]
+            self._send(conn, constants.OKAY, self.next_id, arg0)
+        elif command == constants.WRTE:
+            stream = self.streams.get(arg1)
+            if stream is None:
+                # 이미 닫힌 스트림에 쓰면 실제 adbd 처럼 CLSE 로 응답
+                self._send(conn, constants.CLSE, 0, arg0)
+                return
+            self._send(conn, constants.OKAY, arg1, arg0)
+            stream[1] += data
+            self._run_lines(conn, arg1, stream)
+        elif command == constants.CLSE:
+            stream = self.streams.pop(arg1, None)
+            if stream is not None:
+                self._send(conn, constants.CLSE, arg1, arg0)
+
+    def _run_lines(self, conn, device_id, stream):
+        host_id, buffer, _ = stream
+        output = bytearray()
+        status = 0
+        closing = False
+        while b'\n' in buffer:
+            line, _, rest = bytes(buffer).partition(b'\n')
+            buffer[:] = rest
+            match = MARKER_LINE.match(line)
+            if match:
+                output += b'\n' + match.group(1) + b' %d\n' % status
+                stream[2] += 1
+                if self.close_after is not None and stream[2] >= self.close_after:
+                    closing = True
+                    break
+            else:
+                self.received.append(line.decode())
+                result, status = self.commands.get(line.decode(), (b'', 127))
+                output += result
+        
+        for start in range(0, len(output), self.chunk_size):
+            self._send(conn, constants.WRTE, device_id, host_id, bytes(output[start:start + self.chunk_size]))
+        if closing:
+            del self.streams[device_id]
+            self._send(conn, constants.CLSE, device_id, host_id)
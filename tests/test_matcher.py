@@ -0,0 +1,60 @@
+"""피라미드 매처(match_pyramid)가 원본 해상도 매처(match_full)와 같은 결과를 내는지 시험"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from ReseMara import TemplateRegistry, match_full, match_pyramid
+
+THRESHOLD = 0.75
+SCREEN_SIZE = (240, 320)    # (height, width) - 가장 큰 참조 이미지보다 크고 매칭이 빠른 크기
+
+registry = TemplateRegistry(os.path.join(ROOT, 'Ref_Img'))
+registry.preload()
+NAMES = sorted(registry.templates)
+
+def background(seed):
+    """실제 화면처럼 완만하게 변하는 무작위 배경"""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (SCREEN_SIZE[0] // 8, SCREEN_SIZE[1] // 8, 3), dtype=np.uint8)
+    return cv2.resize(noise, (SCREEN_SIZE[1], SCREEN_SIZE[0]), interpolation=cv2.INTER_CUBIC)
+
+def paste(screen, template, x, y):
+    """참조 이미지를 (x, y)에 붙여넣기 (투명 영역은 배경 유지)"""
+    area = screen[y:y + template.height, x:x + template.width]
+    if template.mask is None:
+        area[:] = template.bgr
+    else:
+        alpha = template.mask.astype(np.float32) / 255
+        area[:] = (template.bgr * alpha + area * (1 - alpha)).astype(np.uint8)
+    return screen
+
+def positions(template, seed):
+    """네 모서리, 가장자리 중간, 화면 안쪽 임의 위치"""
+    max_x = SCREEN_SIZE[1] - template.width
+    max_y = SCREEN_SIZE[0] - template.height
+    rng = np.random.default_rng(seed)
+    return [(0, 0), (max_x, 0), (0, max_y), (max_x, max_y), (max_x, max_y // 2 + 1),
+            (int(rng.integers(1, max_x)), int(rng.integers(1, max_y)))]
+
+@pytest.mark.parametrize('name', NAMES)
+def test_pyramid_matches_full(name):
+    template = registry.get(name)
+    seed = NAMES.index(name)
+    
+    for x, y in positions(template, seed):
+        screen = paste(background(seed), template, x, y)
+        full_val, full_loc = match_full(screen, template)
+        pyramid_val, pyramid_loc = match_pyramid(screen, template)
+        
+        where = f"{name} at ({x}, {y})"
+        assert full_val >= THRESHOLD, where
+        assert full_loc == (x, y), where
+        assert pyramid_val >= THRESHOLD, f"{where}: pyramid {pyramid_val:.4f}"
+        assert pyramid_loc == full_loc, f"{where}: pyramid {pyramid_loc}"
+    
+    # 참조 이미지가 없는 화면에서는 두 매처 모두 발견하지 않음
+    screen = background(seed + 1000)
+    assert (match_full(screen, template)[0] >= THRESHOLD) == (match_pyramid(screen, template)[0] >= THRESHOLD)
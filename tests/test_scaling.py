@@ -0,0 +1,38 @@
+"""기기 해상도에 맞춘 참조 이미지/좌표 변환(ScreenScaler, Template.at_scale) 시험"""
+import numpy as np
+
+from ReseMara import ScreenScaler, Template
+
+def make_template(width=40, height=20, region=None):
+    image = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    template = Template('button', image)
+    template.region = region
+    return template
+
+def test_scaler_keeps_axes_separate():
+    scaler = ScreenScaler((1280, 720))
+    assert scaler.update(1600, 720)
+    assert not scaler.update(1600, 720)
+    # 종횡비가 다르면 픽셀 배율은 작은 쪽, 좌표는 축마다 따로
+    assert scaler.scale == 1.0
+    assert scaler.region_scale == (1.25, 1.0)
+    assert scaler.to_device(100, 450) == (125, 450)
+
+def test_scaler_uses_captured_orientation():
+    scaler = ScreenScaler((1280, 720))
+    scaler.update(540, 960)
+    # 캡처한 화면 크기를 그대로 사용 (축을 바꾸지 않음)
+    assert scaler.to_device(1280, 720) == (540, 960)
+
+def test_at_scale_region_per_axis():
+    template = make_template(region=(100, 200, 80, 40))
+    
+    scaled = template.at_scale(0.75, (0.75, 0.75))
+    assert (scaled.width, scaled.height) == (30, 15)
+    assert scaled.region == (75, 150, 60, 30)
+    assert template.at_scale(0.75, (0.75, 0.75)) is scaled
+    
+    wide = template.at_scale(1.0, (1.25, 1.0))
+    assert wide.bgr is template.bgr
+    assert wide.region == (125, 200, 100, 40)
+    assert template.at_scale(1.0, (1.0, 1.0)) is template
@@ -0,0 +1,64 @@
+"""대화형 shell 세션(ShellSession / ShellSessionPool)을 가짜 adbd 에 연결하여 시험"""
+import pytest
+from adb_shell.adb_device import AdbDeviceTcp
+
+from fake_adbd import FakeAdbd
+from ReseMara import ShellSession, ShellSessionPool
+
+@pytest.fixture
+def connect():
+    servers = []
+    devices = []
+    
+    def _connect(**options):
+        server = FakeAdbd(**options)
+        device = AdbDeviceTcp('127.0.0.1', server.port, default_transport_timeout_s=5)
+        device.connect(read_timeout_s=5)
+        servers.append(server)
+        devices.append(device)
+        return server, device
+    
+    yield _connect
+    for device in devices:
+        device.close()
+    for server in servers:
+        server.close()
+
+def test_framed_output(connect):
+    server, device = connect(commands={
+        'wm size': (b'Physical size: 1280x720\n', 0),
+        'printf abc': (b'abc', 0),
+        'false': (b'', 1),
+    })
+    session = ShellSession(device, read_timeout=5)
+    
+    assert session.run('wm size') == 'Physical size: 1280x720\n'
+    assert session.last_status == 0
+    # 출력이 줄바꿈으로 끝나지 않아도 표식 앞 줄바꿈만 제거
+    assert session.run('printf abc') == 'abc'
+    assert session.run('false') == ''
+    assert session.last_status == 1
+    assert session.run('wm size', decode=False) == b'Physical size: 1280x720\n'
+    assert server.received == ['wm size', 'printf abc', 'false', 'wm size']
+    assert server.opened == 1
+
+def test_marker_split_across_packets(connect):
+    output = bytes(range(256)) * 4 + b'\n'
+    server, device = connect(commands={'screencap': (output, 0)}, chunk_size=7)
+    session = ShellSession(device, read_timeout=5)
+    
+    # 표식과 종료 코드가 7바이트 WRTE 여러 개로 나뉘어 와도 한 명령의 출력으로 합침
+    assert session.run('screencap', decode=False) == output
+    assert session.run('screencap', decode=False) == output
+    assert session.last_status == 0
+
+def test_reconnect_after_device_close(connect):
+    server, device = connect(commands={'pidof game': (b'1234\n', 0)}, close_after=1)
+    pool = ShellSessionPool(device, size=1)
+    
+    for _ in range(3):
+        assert pool.shell('pidof game') == '1234\n'
+    # 기기가 명령마다 스트림을 닫아도 새 세션으로 다시 열고, 일반 shell 로 전환하지 않음
+    assert pool.enabled
+    assert server.opened == 3
+    assert server.received == ['pidof game'] * 3
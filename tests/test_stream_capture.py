@@ -0,0 +1,139 @@
+"""화면 스트림 백엔드(RawFrameStreamParser / StreamCapture)를 합성한 원시 스트림과 녹화 파일로 시험"""
+import struct
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from ReseMara import RawFrameStreamParser, StreamCapture, iter_recorded_stream
+
+WIDTH, HEIGHT = 8, 6
+
+def raw_frame(value, header_size=16, pixel_format=1):
+    """screencap 원시 출력 한 장 (픽셀마다 [value, value+1, value+2, 255])"""
+    header = struct.pack('<III', WIDTH, HEIGHT, pixel_format)
+    if header_size == 16:
+        header += struct.pack('<I', 0)
+    pixel = bytes([value, value + 1, value + 2, 255])
+    return header + pixel * (WIDTH * HEIGHT)
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+def assert_frame(frame, value, order='RGBA'):
+    assert frame.order == order
+    assert frame.pixels.shape == (HEIGHT, WIDTH, 4)
+    assert np.all(frame.pixels[:, :, 0] == value)
+    assert np.all(frame.pixels[:, :, 2] == value + 2)
+
+@pytest.mark.parametrize('header_size', [12, 16])
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 1 << 16])
+def test_parser_frames_split_across_chunks(header_size, chunk_size):
+    stream = b''.join(raw_frame(value, header_size) for value in (10, 20, 30))
+    parser = RawFrameStreamParser(header_size)
+
+    # 헤더/픽셀 중간에서 잘린 청크를 이어 붙여 프레임 단위로 반환
+    frames = []
+    for chunk in chunks(stream, chunk_size):
+        frames += parser.feed(chunk)
+
+    assert len(frames) == 3
+    for frame, value in zip(frames, (10, 20, 30)):
+        assert_frame(frame, value)
+    assert not parser.buffer
+
+def test_parser_keeps_partial_frame():
+    data = raw_frame(40) + raw_frame(50)
+    parser = RawFrameStreamParser(16)
+
+    frames = parser.feed(data[:len(data) - 5])
+    assert len(frames) == 1
+    assert_frame(frames[0], 40)
+    # 나머지 5바이트가 와야 두 번째 프레임 완성
+    frames = parser.feed(data[len(data) - 5:])
+    assert len(frames) == 1
+    assert_frame(frames[0], 50)
+
+def test_parser_rejects_unknown_format():
+    parser = RawFrameStreamParser(16)
+    with pytest.raises(ValueError):
+        parser.feed(raw_frame(10, pixel_format=99))
+
+def test_recorded_stream(tmp_path):
+    path = tmp_path / 'record.raw'
+    path.write_bytes(b''.join(raw_frame(value, pixel_format=5) for value in range(0, 50, 10)))
+    parser = RawFrameStreamParser(16)
+
+    frames = [frame for chunk in iter_recorded_stream(str(path), chunk_size=37) for frame in parser.feed(chunk)]
+
+    assert len(frames) == 5
+    for frame, value in zip(frames, range(0, 50, 10)):
+        assert_frame(frame, value, 'BGRA')
+
+def wait_for_frame(capture, count, timeout=5):
+    deadline = time.time() + timeout
+    while capture.frame_id < count:
+        assert time.time() < deadline, "스트림에서 프레임을 받지 못했습니다"
+        time.sleep(0.01)
+
+class FakeStreamDevice:
+    """
+    screencap 한 번과 반복 screencap 스트림을 흉내 내는 기기 (스트림은 연결마다 새로 시작)
+    values 의 프레임을 모두 보낸 뒤에는 실제 기기처럼 다음 화면을 보내지 않고 대기
+    """
+    def __init__(self, values, chunk_size=29, fail_first=False):
+        self.values = values
+        self.chunk_size = chunk_size
+        self.fail_first = fail_first
+        self.streams = []
+        self.closed = threading.Event()
+
+    def shell(self, command, decode=True):
+        assert command == 'screencap'
+        return raw_frame(self.values[0])
+
+    def streaming_shell(self, command, decode=True):
+        self.streams.append(command)
+        if self.fail_first and len(self.streams) == 1:
+            # 첫 연결은 한 프레임 중간에 끊어짐
+            yield raw_frame(self.values[0])[:50]
+            raise ConnectionError("stream closed")
+        for value in self.values:
+            yield from chunks(raw_frame(value), self.chunk_size)
+        self.closed.wait(5)
+
+def test_stream_capture_from_device():
+    device = FakeStreamDevice([60, 70, 80])
+    capture = StreamCapture.from_device(device, interval=0.5)
+    try:
+        assert capture.header_size == 16
+        wait_for_frame(capture, 3)
+        frame = capture.grab()
+        assert_frame(frame, 80)
+        # 새 프레임이 없으면 같은 Frame 을 다시 반환
+        assert capture.grab() is capture.grab()
+        assert device.streams[0] == 'while true; do screencap; sleep 0.5; done'
+    finally:
+        capture.close()
+        device.closed.set()
+
+def test_stream_capture_reconnects_after_error():
+    device = FakeStreamDevice([90, 100], fail_first=True)
+    capture = StreamCapture.from_device(device)
+    try:
+        # 끊어진 연결의 잘린 프레임은 버리고 다시 연결한 스트림의 프레임부터 사용
+        wait_for_frame(capture, 2)
+        assert len(device.streams) >= 2
+        assert_frame(capture.grab(), 100)
+    finally:
+        capture.close()
+        device.closed.set()
+
+def test_stream_capture_timeout():
+    capture = StreamCapture(lambda: iter(()), 16, frame_timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError):
+            capture.grab()
+    finally:
+        capture.close()